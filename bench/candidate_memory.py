@@ -0,0 +1,80 @@
+"""
+Benchmark — memory per 10k scanned videos: pyrogram Message vs Candidate.
+
+Before candidates.Candidate the scanner kept a full pyrogram Message for
+every video it ranked.  This builds N of each (a Message with its Chat,
+Video, one thumbnail, caption and two entities, the way a channel post
+arrives; a Candidate with the fields ranking and forwarding read) and
+measures them with tracemalloc.
+
+    python bench/candidate_memory.py [count]
+"""
+
+import os
+import sys
+import tracemalloc
+from datetime import datetime
+from typing import Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyrogram import enums, types  # noqa: E402
+
+from candidates import Candidate  # noqa: E402
+
+COUNT = 10_000  # Objects built per kind
+
+
+def message(i: int) -> types.Message:
+    """A channel video post as the scanner used to keep it."""
+    chat = types.Chat(
+        id=-1001234567890, type=enums.ChatType.CHANNEL,
+        title="Some channel title", username="somechannel",
+    )
+    video = types.Video(
+        file_id="BAACAgQAAxkBAAIB" + str(i) * 10, file_unique_id="AgAD" + str(i),
+        width=1280, height=720, duration=600, file_name="v.mp4", mime_type="video/mp4",
+        file_size=50_000_000 + i, date=datetime.now(),
+        thumbs=[types.Thumbnail(
+            file_id="AAMCBAADGQEAAQ" + str(i) * 8, file_unique_id="AQAD" + str(i),
+            width=320, height=180, file_size=12000,
+        )],
+    )
+    return types.Message(
+        id=i, chat=chat, sender_chat=chat, date=datetime.now(), video=video,
+        caption="Caption text for the video " * 4,
+        caption_entities=[
+            types.MessageEntity(type=enums.MessageEntityType.BOLD, offset=0, length=5),
+            types.MessageEntity(type=enums.MessageEntityType.URL, offset=10, length=20),
+        ],
+        views=1000 + i, forwards=5, media=enums.MessageMediaType.VIDEO,
+    )
+
+
+def candidate(i: int) -> Candidate:
+    """The same post as a Candidate."""
+    return Candidate(
+        i, 1_700_000_000 + i, 600, 1000 + i, 5, 3,
+        "AgAD" + str(i), f"{50_000_000 + i}:600:video/mp4", 1_700_000_000,
+    )
+
+
+def measure(build: Callable[[int], object], count: int) -> int:
+    """Bytes still allocated while `count` objects from `build` are alive."""
+    tracemalloc.start()
+    objects = [build(i) for i in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size
+
+
+def main(count: int) -> None:
+    print(f"memory per {count:,} scanned videos:")
+    for name, build in (("pyrogram Message", message), ("Candidate", candidate)):
+        size = measure(build, count)
+        print(f"  {name:<18}{size / 1e6:7.1f} MB  ({size / count / 1000:.2f} KB each)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else COUNT)
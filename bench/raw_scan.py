@@ -0,0 +1,112 @@
+"""
+Benchmark — raw TL scan path vs pyrogram Message parsing (scanner.RAW_SCAN).
+
+Builds a fixed 100-message channel page the way messages.GetHistory returns
+it (seeded, so every run sees the same page: text posts with entities,
+videos, a few GIFs, reactions on every other post), checks that both paths
+yield identical Candidates, then times each one per page.
+
+The page is built from TL objects rather than read back from bytes: pyrofork
+can't round-trip Message/Channel through TLObject.write()/read().
+
+    python bench/raw_scan.py [pages]
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import AsyncIterator
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyrogram import Client, raw, utils  # noqa: E402
+from pyrogram.types import Message  # noqa: E402
+
+import scanner  # noqa: E402
+from candidates import Candidate  # noqa: E402
+
+CHANNEL_ID = 1234567890
+PAGE       = 100  # Messages in the fixture page (scanner.PAGE_SIZE)
+SEED       = 1
+RUNS       = 200  # Pages timed per path
+
+
+def fixture(n: int = PAGE, seed: int = SEED) -> raw.types.messages.ChannelMessages:
+    """One GetHistory page of a busy channel, newest first."""
+    rng = random.Random(seed)
+    now = int(time.time())
+    chat = raw.types.Channel(
+        id=CHANNEL_ID, title="chan", photo=raw.types.ChatPhotoEmpty(), date=now,
+        access_hash=42, broadcast=True, username="chan", usernames=[], restriction_reason=[],
+    )
+    messages = []
+    for i in range(n, 0, -1):
+        kind  = rng.random()
+        media = None
+        if kind < 0.3:
+            attributes = [
+                raw.types.DocumentAttributeVideo(duration=300 + i, w=1280, h=720, supports_streaming=True),
+                raw.types.DocumentAttributeFilename(file_name=f"v{i}.mp4"),
+            ]
+            if kind < 0.02:
+                attributes.append(raw.types.DocumentAttributeAnimated())  # A GIF, not a video
+            media = raw.types.MessageMediaDocument(document=raw.types.Document(
+                id=10**12 + i, access_hash=7, file_reference=b"ref", date=now,
+                mime_type="video/mp4", size=10**7 + i, dc_id=2, attributes=attributes,
+                thumbs=[raw.types.PhotoSize(type="m", w=320, h=180, size=5000)],
+            ))
+        reactions = raw.types.MessageReactions(
+            results=[raw.types.ReactionCount(reaction=raw.types.ReactionEmoji(emoticon="👍"), count=i)],
+            recent_reactions=[], top_reactors=[],
+        ) if i % 2 else None
+        messages.append(raw.types.Message(
+            id=i, peer_id=raw.types.PeerChannel(channel_id=CHANNEL_ID), date=now - (n - i) * 60,
+            message="Lorem ipsum dolor sit amet " * 8,
+            entities=[
+                raw.types.MessageEntityBold(offset=0, length=5),
+                raw.types.MessageEntityUrl(offset=6, length=5),
+            ],
+            media=media, views=1000 + i, forwards=i, post=True, reactions=reactions,
+        ))
+    return raw.types.messages.ChannelMessages(
+        pts=1, count=n, messages=messages, topics=[], chats=[chat], users=[]
+    )
+
+
+async def _iterate(messages: list[Message]) -> AsyncIterator[Message]:
+    for msg in messages:
+        yield msg
+
+
+async def high_level(client: Client, page) -> list[Candidate]:
+    """RAW_SCAN off: parse_messages, then scanner._videos."""
+    messages = await utils.parse_messages(client, page, replies=0)
+    return [c async for c in scanner._videos(_iterate(messages))]
+
+
+async def raw_path(client: Client, page) -> list[Candidate]:
+    """RAW_SCAN on: scanner._raw_candidate straight from the TL objects."""
+    return [c for msg in page.messages if (c := scanner._raw_candidate(msg))]
+
+
+async def main(runs: int) -> None:
+    page   = fixture()
+    client = Client("bench", api_id=1, api_hash="x", in_memory=True)
+
+    expected, got = await high_level(client, page), await raw_path(client, page)
+    videos = sum(1 for m in page.messages if m.media)
+    print(f"fixture: {PAGE} messages, {videos} with video documents")
+    print(f"candidates: high-level {len(expected)}, raw {len(got)}, identical: {expected == got}")
+
+    for name, path in (("high-level parse_messages + _videos", high_level),
+                       ("raw _raw_candidate", raw_path)):
+        start = time.perf_counter()
+        for _ in range(runs):
+            await path(client, page)
+        print(f"  {name:<38}{(time.perf_counter() - start) / runs * 1000:6.2f} ms / page")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else RUNS))
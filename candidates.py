@@ -0,0 +1,40 @@
+"""
+Candidate record — the only thing kept about a scanned video.
+
+A Pyrogram Message drags its Chat, Video, thumbnails, caption and entities
+along with it (~6 KB each); a Candidate carries just the fields ranking and
+forwarding read, in a __slots__ dataclass (~0.35 KB), so raising SCAN_LIMIT
+grows memory by a few hundred bytes per video.
+"""
+
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class Candidate:
+    id:             int
+    date:           int  # Unix time posted
+    duration:       int
+    views:          int
+    forwards:       int
+    reactions:      int
+    file_unique_id: str | None
+    fingerprint:    str | None
+    fetched_at:     int = 0  # Unix time the counts were read
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "Candidate":
+        """From a db.get_cached_videos() row."""
+        mid, date, duration, views, fetched_at, fuid, fp, forwards, reactions = row
+        return cls(mid, date, duration, views, forwards, reactions, fuid, fp, fetched_at)
+
+    def cache_row(self) -> tuple:
+        """For db.save_scan()."""
+        return (
+            self.id, self.date, self.duration, self.views,
+            self.file_unique_id, self.fingerprint, self.forwards, self.reactions,
+        )
+
+    def keys(self) -> tuple[str | None, str | None]:
+        """Identities used to spot the same video reposted elsewhere."""
+        return self.file_unique_id, self.fingerprint
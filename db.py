@@ -1,20 +1,117 @@
 """
 Database layer — SQLite via aiosqlite for async operations.
-Tables: channels, settings, sent_videos
+Tables: channels, settings, send_windows, sent_videos, channel_state, video_cache,
+        channel_stats, job_runs, job_steps, job_lease, job_triggers, dialogs
+
+init_db() opens one Database per data directory and keeps it for the life of
+the process: a single writer connection (writes are serialised behind a lock)
+plus a small pool of reader connections.  Everything runs in WAL mode so
+readers never wait for the writer, and because the connections are long-lived
+sqlite3's per-connection statement cache is reused across calls.
 """
 
-import aiosqlite
+import asyncio
 import os
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import AsyncIterator, Iterable
+
+import aiosqlite
+
+READ_POOL_SIZE  = 3    # Reader connections kept open next to the writer
+STATEMENT_CACHE = 256  # Prepared statements cached per connection
 
 
 def db_path(data_dir: str) -> str:
     return os.path.join(data_dir, "bot.db")
 
 
+# ── Connection manager ───────────────────────────────────────────────────────
+
+class Database:
+    """Long-lived connections to a single bot.db file."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._writer: aiosqlite.Connection | None = None
+        self._write_lock = asyncio.Lock()
+        self._readers: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._connections: list[aiosqlite.Connection] = []
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path, cached_statements=STATEMENT_CACHE)
+        await conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA busy_timeout=5000;
+        """)
+        self._connections.append(conn)
+        return conn
+
+    async def open(self) -> None:
+        self._writer = await self._connect()
+        for _ in range(READ_POOL_SIZE):
+            self._readers.put_nowait(await self._connect())
+
+    async def close(self) -> None:
+        for conn in self._connections:
+            await conn.close()
+        self._connections.clear()
+        self._writer = None
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a reader connection from the pool."""
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Hold the writer for one transaction; commits on success, rolls back on error."""
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            await self._writer.commit()
+
+
+_databases: dict[str, Database] = {}
+
+
+def _db(data_dir: str) -> Database:
+    try:
+        return _databases[db_path(data_dir)]
+    except KeyError:
+        raise RuntimeError(f"Database for {data_dir} is not open — call init_db() first") from None
+
+
+async def _add_missing_columns(
+    db: aiosqlite.Connection, table: str, columns: dict[str, str]
+) -> None:
+    async with db.execute(f"PRAGMA table_info({table})") as cur:
+        existing = {row[1] for row in await cur.fetchall()}
+    for name, decl in columns.items():
+        if name not in existing:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
 async def init_db(data_dir: str) -> None:
+    path = db_path(data_dir)
+    if path in _databases:
+        return
+
     Path(data_dir).mkdir(parents=True, exist_ok=True)
-    async with aiosqlite.connect(db_path(data_dir)) as db:
+    database = Database(path)
+    await database.open()
+    _databases[path] = database
+
+    async with database.write() as db:
         await db.executescript("""
             CREATE TABLE IF NOT EXISTS channels (
                 channel_id   TEXT PRIMARY KEY,
@@ -27,82 +124,631 @@ async def init_db(data_dir: str) -> None:
                 value TEXT NOT NULL
             );
 
+            -- Extra daily send times ("HH:MM"); the default one lives in settings
+            CREATE TABLE IF NOT EXISTS send_windows (
+                send_window TEXT PRIMARY KEY
+            );
+
             CREATE TABLE IF NOT EXISTS sent_videos (
                 message_id TEXT NOT NULL,
                 channel_id TEXT NOT NULL,
                 sent_date  TEXT NOT NULL,
+                file_unique_id TEXT,
+                fingerprint    TEXT,
                 PRIMARY KEY (message_id, channel_id)
             );
+            CREATE INDEX IF NOT EXISTS idx_sent_videos_date ON sent_videos (sent_date);
+
+            -- Per-channel high-water mark: history older than this was already scanned
+            CREATE TABLE IF NOT EXISTS channel_state (
+                channel_id      TEXT PRIMARY KEY,
+                last_message_id INTEGER NOT NULL DEFAULT 0,
+                last_scanned_at INTEGER NOT NULL
+            );
+
+            -- Videos seen while scanning, so ranking needs no history re-download
+            CREATE TABLE IF NOT EXISTS video_cache (
+                channel_id TEXT    NOT NULL,
+                message_id INTEGER NOT NULL,
+                date       INTEGER NOT NULL,
+                duration   INTEGER NOT NULL,
+                views      INTEGER NOT NULL,
+                fetched_at INTEGER NOT NULL,
+                file_unique_id TEXT,
+                fingerprint    TEXT,
+                forwards       INTEGER NOT NULL DEFAULT 0,
+                reactions      INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (channel_id, message_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_video_cache_date ON video_cache (channel_id, date);
+
+            -- Per-channel scoring baseline; subscribers are re-fetched at most once a day
+            CREATE TABLE IF NOT EXISTS channel_stats (
+                channel_id     TEXT PRIMARY KEY,
+                subscribers    INTEGER NOT NULL DEFAULT 0,
+                subscribers_at INTEGER NOT NULL DEFAULT 0,
+                median_views   REAL    NOT NULL DEFAULT 0
+            );
+
+            -- Run journal, so a daily job cut off by a restart resumes where it stopped
+            CREATE TABLE IF NOT EXISTS job_runs (
+                run_id      INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_date    TEXT    NOT NULL,
+                started_at  INTEGER NOT NULL,
+                finished_at INTEGER,
+                status      TEXT    NOT NULL,  -- running | done | abandoned
+                send_window TEXT    NOT NULL DEFAULT '',  -- '' = default window
+                prescan     INTEGER NOT NULL DEFAULT 0   -- 1 until a send job takes the run over
+            );
+
+            -- message_id 0 marks a channel as scanned (and its picks recorded);
+            -- other rows are picks, state 'selected' until forwarded ('sent')
+            CREATE TABLE IF NOT EXISTS job_steps (
+                run_id         INTEGER NOT NULL,
+                channel_id     TEXT    NOT NULL,
+                message_id     INTEGER NOT NULL,
+                state          TEXT    NOT NULL,
+                views          INTEGER NOT NULL DEFAULT 0,
+                file_unique_id TEXT,
+                fingerprint    TEXT,
+                PRIMARY KEY (run_id, channel_id, message_id)
+            );
+
+            -- Userbot's chats by id, so a numeric ID resolves without a dialog sweep
+            CREATE TABLE IF NOT EXISTS dialogs (
+                chat_id     INTEGER PRIMARY KEY,  -- Bot API style id (-100… for channels)
+                access_hash INTEGER NOT NULL,
+                peer_type   TEXT    NOT NULL,     -- Pyrogram storage type: channel, supergroup, …
+                title       TEXT,
+                username    TEXT,
+                updated_at  INTEGER NOT NULL
+            );
+
+            -- Who may run the daily job right now, across processes / replicas
+            CREATE TABLE IF NOT EXISTS job_lease (
+                name       TEXT PRIMARY KEY,
+                holder     TEXT    NOT NULL,
+                expires_at INTEGER NOT NULL
+            );
+
+            -- Scheduled triggers already claimed, so each fires once across replicas
+            CREATE TABLE IF NOT EXISTS job_triggers (
+                job_id     TEXT    NOT NULL,
+                fire_key   TEXT    NOT NULL,  -- Scheduled fire time, or the run being resumed
+                holder     TEXT    NOT NULL,
+                claimed_at INTEGER NOT NULL,
+                PRIMARY KEY (job_id, fire_key)
+            );
+        """)
+        # Columns added after a table was first created (older bot.db files)
+        await _add_missing_columns(db, "video_cache", {
+            "file_unique_id": "TEXT",
+            "fingerprint":    "TEXT",
+            "forwards":       "INTEGER NOT NULL DEFAULT 0",
+            "reactions":      "INTEGER NOT NULL DEFAULT 0",
+        })
+        await _add_missing_columns(db, "sent_videos", {"file_unique_id": "TEXT", "fingerprint": "TEXT"})
+        await _add_missing_columns(db, "channels", {"send_window": "TEXT"})  # NULL = default window
+        await _add_missing_columns(db, "job_runs", {
+            "send_window": "TEXT NOT NULL DEFAULT ''",
+            "prescan":     "INTEGER NOT NULL DEFAULT 0",
+        })
+        await _add_missing_columns(db, "channel_state", {"fetch_rate": "REAL"})  # Msgs/hour a scan reads
+        await db.executescript("""
+            CREATE INDEX IF NOT EXISTS idx_sent_videos_fuid ON sent_videos (file_unique_id);
+            CREATE INDEX IF NOT EXISTS idx_sent_videos_fp   ON sent_videos (fingerprint);
         """)
-        await db.commit()
+
+
+async def close_db(data_dir: str) -> None:
+    database = _databases.pop(db_path(data_dir), None)
+    if database is not None:
+        await database.close()
 
 
 # ── Channels ────────────────────────────────────────────────────────────────
 
 async def add_channel(data_dir: str, channel_id: str, channel_name: str) -> None:
-    async with aiosqlite.connect(db_path(data_dir)) as db:
+    async with _db(data_dir).write() as db:
         await db.execute(
-            "INSERT OR REPLACE INTO channels (channel_id, channel_name, active) VALUES (?, ?, 1)",
+            "INSERT INTO channels (channel_id, channel_name, active) VALUES (?, ?, 1) "
+            "ON CONFLICT (channel_id) DO UPDATE SET channel_name=excluded.channel_name, active=1",
             (str(channel_id), channel_name),
         )
-        await db.commit()
 
 
 async def remove_channel(data_dir: str, channel_id: str) -> bool:
-    async with aiosqlite.connect(db_path(data_dir)) as db:
+    async with _db(data_dir).write() as db:
         cur = await db.execute(
             "UPDATE channels SET active=0 WHERE channel_id=? AND active=1",
             (str(channel_id),),
         )
-        await db.commit()
         return cur.rowcount > 0
 
 
 async def get_channels(data_dir: str) -> list[tuple[str, str]]:
-    async with aiosqlite.connect(db_path(data_dir)) as db:
+    async with _db(data_dir).read() as db:
         async with db.execute(
             "SELECT channel_id, channel_name FROM channels WHERE active=1"
         ) as cur:
             return await cur.fetchall()
 
 
+# ── Send windows ─────────────────────────────────────────────────────────────
+
+async def get_send_windows(data_dir: str) -> list[str]:
+    """Extra send windows ("HH:MM"), earliest first."""
+    async with _db(data_dir).read() as db:
+        async with db.execute("SELECT send_window FROM send_windows ORDER BY send_window") as cur:
+            return [w for (w,) in await cur.fetchall()]
+
+
+async def add_send_window(data_dir: str, window: str) -> bool:
+    async with _db(data_dir).write() as db:
+        cur = await db.execute(
+            "INSERT OR IGNORE INTO send_windows (send_window) VALUES (?)", (window,)
+        )
+        return cur.rowcount > 0
+
+
+async def remove_send_window(data_dir: str, window: str) -> bool:
+    """Drop a window; its channels fall back to the default window."""
+    async with _db(data_dir).write() as db:
+        cur = await db.execute("DELETE FROM send_windows WHERE send_window=?", (window,))
+        await db.execute("UPDATE channels SET send_window=NULL WHERE send_window=?", (window,))
+        return cur.rowcount > 0
+
+
+async def set_channel_window(data_dir: str, channel_id: str, window: str | None) -> bool:
+    """Move an active channel to `window` (None = the default window)."""
+    async with _db(data_dir).write() as db:
+        cur = await db.execute(
+            "UPDATE channels SET send_window=? WHERE channel_id=? AND active=1",
+            (window, str(channel_id)),
+        )
+        return cur.rowcount > 0
+
+
+async def get_window_channels(data_dir: str, window: str | None) -> list[tuple[str, str]]:
+    """Active channels sent in `window`; None is the default window."""
+    async with _db(data_dir).read() as db:
+        async with db.execute(
+            "SELECT channel_id, channel_name FROM channels "
+            "WHERE active=1 AND send_window IS ?",
+            (window,),
+        ) as cur:
+            return await cur.fetchall()
+
+
+async def get_channel_windows(data_dir: str) -> list[tuple[str, str, str | None]]:
+    """Every active channel as (channel_id, channel_name, send_window)."""
+    async with _db(data_dir).read() as db:
+        async with db.execute(
+            "SELECT channel_id, channel_name, send_window FROM channels WHERE active=1"
+        ) as cur:
+            return await cur.fetchall()
+
+
 # ── Settings ─────────────────────────────────────────────────────────────────
 
 async def get_setting(data_dir: str, key: str, default: str | None = None) -> str | None:
-    async with aiosqlite.connect(db_path(data_dir)) as db:
+    async with _db(data_dir).read() as db:
         async with db.execute("SELECT value FROM settings WHERE key=?", (key,)) as cur:
             row = await cur.fetchone()
             return row[0] if row else default
 
 
 async def set_setting(data_dir: str, key: str, value: str) -> None:
-    async with aiosqlite.connect(db_path(data_dir)) as db:
+    async with _db(data_dir).write() as db:
         await db.execute(
             "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
             (key, str(value)),
         )
-        await db.commit()
 
 
 # ── Sent-videos dedup ────────────────────────────────────────────────────────
 
-async def was_sent_today(data_dir: str, message_id: str, channel_id: str) -> bool:
+async def get_sent_today(
+    data_dir: str, channel_id: str | None = None
+) -> set[tuple[str, str]]:
+    """(message_id, channel_id) pairs sent today — for one channel, or all when channel_id is None."""
     from datetime import date
     today = str(date.today())
-    async with aiosqlite.connect(db_path(data_dir)) as db:
+    query = "SELECT message_id, channel_id FROM sent_videos WHERE sent_date=?"
+    params: tuple = (today,)
+    if channel_id is not None:
+        query += " AND channel_id=?"
+        params += (str(channel_id),)
+    async with _db(data_dir).read() as db:
+        async with db.execute(query, params) as cur:
+            return {(mid, cid) for mid, cid in await cur.fetchall()}
+
+
+async def mark_many_as_sent(
+    data_dir: str,
+    sent: Iterable[tuple[str, str, str | None, str | None]],
+    run_id: int | None = None,
+) -> None:
+    """
+    Record several (message_id, channel_id, file_unique_id, fingerprint) rows
+    in one transaction — and, given a run_id, mark the matching journal picks sent.
+    """
+    from datetime import date
+    today = str(date.today())
+    sent = list(sent)
+    async with _db(data_dir).write() as db:
+        await db.executemany(
+            "INSERT OR IGNORE INTO sent_videos "
+            "(message_id, channel_id, sent_date, file_unique_id, fingerprint) VALUES (?, ?, ?, ?, ?)",
+            [(str(mid), str(cid), today, fuid, fp) for mid, cid, fuid, fp in sent],
+        )
+        if run_id is not None:
+            await db.executemany(
+                "UPDATE job_steps SET state='sent' WHERE run_id=? AND channel_id=? AND message_id=?",
+                [(run_id, str(cid), int(mid)) for mid, cid, _, _ in sent],
+            )
+
+
+async def get_sent_fingerprints(data_dir: str, since: str) -> set[str]:
+    """file_unique_ids and fallback fingerprints of every video sent on or after `since` (YYYY-MM-DD)."""
+    async with _db(data_dir).read() as db:
+        async with db.execute(
+            "SELECT file_unique_id FROM sent_videos WHERE sent_date>=? AND file_unique_id IS NOT NULL "
+            "UNION SELECT fingerprint FROM sent_videos WHERE sent_date>=? AND fingerprint IS NOT NULL",
+            (since, since),
+        ) as cur:
+            return {key for (key,) in await cur.fetchall()}
+
+
+# ── Incremental scanning ─────────────────────────────────────────────────────
+
+async def get_scan_marks(data_dir: str) -> dict[str, int]:
+    """channel_id → highest message ID already scanned."""
+    async with _db(data_dir).read() as db:
+        async with db.execute("SELECT channel_id, last_message_id FROM channel_state") as cur:
+            return {cid: mid for cid, mid in await cur.fetchall()}
+
+
+async def get_scan_rates(data_dir: str) -> dict[str, tuple[float, int]]:
+    """
+    channel_id → (messages per hour its scans fetch, as last measured, or 0;
+    unix time it was last scanned).
+    """
+    async with _db(data_dir).read() as db:
         async with db.execute(
-            "SELECT 1 FROM sent_videos WHERE message_id=? AND channel_id=? AND sent_date=?",
-            (str(message_id), str(channel_id), today),
+            "SELECT channel_id, COALESCE(fetch_rate, 0), last_scanned_at FROM channel_state"
         ) as cur:
-            return await cur.fetchone() is not None
+            return {cid: (rate, scanned_at) for cid, rate, scanned_at in await cur.fetchall()}
 
 
-async def mark_as_sent(data_dir: str, message_id: str, channel_id: str) -> None:
+async def save_scan(
+    data_dir: str,
+    channel_id: str,
+    videos: list[tuple[int, int, int, int, str, str | None, int, int]],
+    last_message_id: int,
+    fetch_rate: float | None = None,
+) -> None:
+    """
+    Cache newly seen videos and advance the channel's mark.  Each video is
+    (message_id, date, duration, views, file_unique_id, fingerprint, forwards, reactions).
+    `fetch_rate` replaces the stored messages-per-hour figure; None keeps it.
+    """
+    now = int(time.time())
+    async with _db(data_dir).write() as db:
+        await db.executemany(
+            "INSERT OR REPLACE INTO video_cache "
+            "(channel_id, message_id, date, duration, views, fetched_at, file_unique_id, "
+            "fingerprint, forwards, reactions) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(str(channel_id), mid, date, duration, views, now, fuid, fp, fwd, react)
+             for mid, date, duration, views, fuid, fp, fwd, react in videos],
+        )
+        await db.execute(
+            "INSERT INTO channel_state (channel_id, last_message_id, last_scanned_at, fetch_rate) "
+            "VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (channel_id) DO UPDATE SET "
+            "last_message_id=MAX(last_message_id, excluded.last_message_id), "
+            "last_scanned_at=excluded.last_scanned_at, "
+            "fetch_rate=COALESCE(excluded.fetch_rate, fetch_rate)",
+            (str(channel_id), last_message_id, now, fetch_rate),
+        )
+
+
+async def get_cached_videos(
+    data_dir: str, channel_id: str, since: int, min_duration: int
+) -> list[tuple[int, int, int, int, int, str | None, str | None, int, int]]:
+    """
+    Cached videos for a channel posted at or after `since`, as (message_id, date,
+    duration, views, fetched_at, file_unique_id, fingerprint, forwards, reactions).
+    """
+    async with _db(data_dir).read() as db:
+        async with db.execute(
+            "SELECT message_id, date, duration, views, fetched_at, file_unique_id, fingerprint, "
+            "forwards, reactions FROM video_cache "
+            "WHERE channel_id=? AND date>=? AND duration>=?",
+            (str(channel_id), since, min_duration),
+        ) as cur:
+            return await cur.fetchall()
+
+
+async def update_cached_counts(
+    data_dir: str,
+    channel_id: str,
+    counts: dict[int, tuple[int, int, int]],
+    gone: Iterable[int] = (),
+) -> None:
+    """Store refreshed (views, forwards, reactions) and drop messages that no longer exist."""
+    now = int(time.time())
+    async with _db(data_dir).write() as db:
+        await db.executemany(
+            "UPDATE video_cache SET views=?, forwards=?, reactions=?, fetched_at=? "
+            "WHERE channel_id=? AND message_id=?",
+            [(v, f, r, now, str(channel_id), mid) for mid, (v, f, r) in counts.items()],
+        )
+        await db.executemany(
+            "DELETE FROM video_cache WHERE channel_id=? AND message_id=?",
+            [(str(channel_id), mid) for mid in gone],
+        )
+
+
+async def update_cached_views(
+    data_dir: str,
+    channel_id: str,
+    counts: dict[int, tuple[int, int]],
+    gone: Iterable[int] = (),
+) -> None:
+    """Like update_cached_counts, for (views, forwards) only: cached reactions are kept."""
+    now = int(time.time())
+    async with _db(data_dir).write() as db:
+        await db.executemany(
+            "UPDATE video_cache SET views=?, forwards=?, fetched_at=? "
+            "WHERE channel_id=? AND message_id=?",
+            [(v, f, now, str(channel_id), mid) for mid, (v, f) in counts.items()],
+        )
+        await db.executemany(
+            "DELETE FROM video_cache WHERE channel_id=? AND message_id=?",
+            [(str(channel_id), mid) for mid in gone],
+        )
+
+
+async def prune_video_cache(data_dir: str, before: int) -> None:
+    """Forget cached videos posted before `before` (unix time)."""
+    async with _db(data_dir).write() as db:
+        await db.execute("DELETE FROM video_cache WHERE date<?", (before,))
+
+
+# ── Channel stats (scoring baseline) ─────────────────────────────────────────
+
+async def get_channel_stats(data_dir: str) -> dict[str, tuple[int, int, float]]:
+    """channel_id → (subscribers, subscribers_at, median_views)."""
+    async with _db(data_dir).read() as db:
+        async with db.execute(
+            "SELECT channel_id, subscribers, subscribers_at, median_views FROM channel_stats"
+        ) as cur:
+            return {cid: (subs, subs_at, med) for cid, subs, subs_at, med in await cur.fetchall()}
+
+
+async def save_channel_stats(
+    data_dir: str, channel_id: str, subscribers: int, subscribers_at: int, median_views: float
+) -> None:
+    async with _db(data_dir).write() as db:
+        await db.execute(
+            "INSERT OR REPLACE INTO channel_stats "
+            "(channel_id, subscribers, subscribers_at, median_views) VALUES (?, ?, ?, ?)",
+            (str(channel_id), subscribers, subscribers_at, median_views),
+        )
+
+
+# ── Run journal ──────────────────────────────────────────────────────────────
+
+async def start_run(
+    data_dir: str, max_age: int, window: str | None = None, prescan: bool = False
+) -> tuple[int, bool]:
+    """
+    Resume the send window's unfinished run started within the last `max_age`
+    seconds, or open a new one.  Returns (run_id, resumed).  Older unfinished
+    runs are abandoned, and journal steps of runs that can no longer resume
+    are dropped.  A run stays flagged as a pre-scan until a send job
+    (prescan=False) resumes it.
+    """
     from datetime import date
-    today = str(date.today())
-    async with aiosqlite.connect(db_path(data_dir)) as db:
+    now = int(time.time())
+    async with _db(data_dir).write() as db:
         await db.execute(
-            "INSERT OR IGNORE INTO sent_videos (message_id, channel_id, sent_date) VALUES (?, ?, ?)",
-            (str(message_id), str(channel_id), today),
+            "UPDATE job_runs SET status='abandoned' WHERE status='running' AND started_at<?",
+            (now - max_age,),
         )
-        await db.commit()
+        await db.execute(
+            "DELETE FROM job_steps WHERE run_id IN "
+            "(SELECT run_id FROM job_runs WHERE status<>'running')"
+        )
+        async with db.execute(
+            "SELECT run_id FROM job_runs WHERE status='running' AND send_window=? "
+            "ORDER BY run_id DESC LIMIT 1",
+            (window or "",),
+        ) as cur:
+            row = await cur.fetchone()
+        if row:
+            if not prescan:
+                await db.execute("UPDATE job_runs SET prescan=0 WHERE run_id=?", (row[0],))
+            return row[0], True
+        cur = await db.execute(
+            "INSERT INTO job_runs (run_date, started_at, status, send_window, prescan) "
+            "VALUES (?, ?, 'running', ?, ?)",
+            (str(date.today()), now, window or "", int(prescan)),
+        )
+        return cur.lastrowid, False
+
+
+async def get_interrupted_runs(data_dir: str, max_age: int) -> list[tuple[str | None, int]]:
+    """
+    (send window, run_id) of each send run (not a pre-scan) left unfinished
+    within the last `max_age` seconds — cut short by a restart.  None is the
+    default window.
+    """
+    async with _db(data_dir).read() as db:
+        async with db.execute(
+            "SELECT send_window, MAX(run_id) FROM job_runs "
+            "WHERE status='running' AND prescan=0 AND started_at>=? GROUP BY send_window",
+            (int(time.time()) - max_age,),
+        ) as cur:
+            return [(window or None, run_id) for window, run_id in await cur.fetchall()]
+
+
+async def finish_run(data_dir: str, run_id: int) -> None:
+    async with _db(data_dir).write() as db:
+        await db.execute(
+            "UPDATE job_runs SET status='done', finished_at=? WHERE run_id=?",
+            (int(time.time()), run_id),
+        )
+
+
+async def record_selection(
+    data_dir: str,
+    run_id: int,
+    channel_ids: Iterable[str],
+    picks: Iterable[tuple[str, int, int, str | None, str | None]],
+) -> None:
+    """
+    Journal channels as scanned together with their picks
+    (channel_id, message_id, views, file_unique_id, fingerprint).
+    """
+    async with _db(data_dir).write() as db:
+        await db.executemany(
+            "INSERT OR IGNORE INTO job_steps (run_id, channel_id, message_id, state) "
+            "VALUES (?, ?, 0, 'scanned')",
+            [(run_id, str(cid)) for cid in channel_ids],
+        )
+        await db.executemany(
+            "INSERT OR IGNORE INTO job_steps "
+            "(run_id, channel_id, message_id, state, views, file_unique_id, fingerprint) "
+            "VALUES (?, ?, ?, 'selected', ?, ?, ?)",
+            [(run_id, str(cid), mid, views, fuid, fp) for cid, mid, views, fuid, fp in picks],
+        )
+
+
+async def get_run_progress(
+    data_dir: str, run_id: int
+) -> tuple[set[str], list[tuple[str, int, int, str | None, str | None]], int]:
+    """
+    Channels already scanned in this run, picks not yet forwarded as
+    (channel_id, message_id, views, file_unique_id, fingerprint), and the
+    number of picks already forwarded.
+    """
+    async with _db(data_dir).read() as db:
+        async with db.execute(
+            "SELECT channel_id FROM job_steps WHERE run_id=? AND message_id=0", (run_id,)
+        ) as cur:
+            scanned = {cid for (cid,) in await cur.fetchall()}
+        async with db.execute(
+            "SELECT channel_id, message_id, views, file_unique_id, fingerprint FROM job_steps "
+            "WHERE run_id=? AND message_id<>0 AND state='selected' ORDER BY rowid",
+            (run_id,),
+        ) as cur:
+            pending = await cur.fetchall()
+        async with db.execute(
+            "SELECT COUNT(*) FROM job_steps WHERE run_id=? AND message_id<>0 AND state='sent'",
+            (run_id,),
+        ) as cur:
+            (sent,) = await cur.fetchone()
+    return scanned, pending, sent
+
+
+# ── Dialog index ─────────────────────────────────────────────────────────────
+
+async def save_dialogs(
+    data_dir: str, dialogs: Iterable[tuple[int, int, str, str | None, str | None]]
+) -> None:
+    """Upsert (chat_id, access_hash, peer_type, title, username) rows."""
+    now = int(time.time())
+    async with _db(data_dir).write() as db:
+        await db.executemany(
+            "INSERT OR REPLACE INTO dialogs "
+            "(chat_id, access_hash, peer_type, title, username, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(*row, now) for row in dialogs],
+        )
+
+
+async def get_dialog(
+    data_dir: str, chat_ids: Iterable[int]
+) -> tuple[int, int, str, str | None, str | None] | None:
+    """First indexed chat among `chat_ids` as (chat_id, access_hash, peer_type, title, username)."""
+    async with _db(data_dir).read() as db:
+        for chat_id in chat_ids:
+            async with db.execute(
+                "SELECT chat_id, access_hash, peer_type, title, username FROM dialogs "
+                "WHERE chat_id=?",
+                (chat_id,),
+            ) as cur:
+                row = await cur.fetchone()
+            if row:
+                return row
+    return None
+
+
+async def get_dialog_rows(
+    data_dir: str, chat_ids: Iterable[int]
+) -> list[tuple[int, int, str, str | None, str | None]]:
+    """Indexed rows for the given chats; chats not in the index are left out."""
+    chat_ids = list(chat_ids)
+    if not chat_ids:
+        return []
+    marks = ", ".join("?" * len(chat_ids))
+    async with _db(data_dir).read() as db:
+        async with db.execute(
+            "SELECT chat_id, access_hash, peer_type, title, username FROM dialogs "
+            f"WHERE chat_id IN ({marks})",
+            chat_ids,
+        ) as cur:
+            return await cur.fetchall()
+
+
+# ── Job lease ────────────────────────────────────────────────────────────────
+
+async def acquire_lease(data_dir: str, name: str, holder: str, ttl: int) -> bool:
+    """
+    Take (or extend) lease `name` for `ttl` seconds.  Succeeds if the lease is
+    free, expired, or already held by `holder`.
+    """
+    now = int(time.time())
+    async with _db(data_dir).write() as db:
+        cur = await db.execute(
+            "INSERT INTO job_lease (name, holder, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET holder=excluded.holder, expires_at=excluded.expires_at "
+            "WHERE job_lease.expires_at<? OR job_lease.holder=excluded.holder",
+            (name, holder, now + ttl, now),
+        )
+        return cur.rowcount > 0
+
+
+async def release_lease(data_dir: str, name: str, holder: str) -> None:
+    async with _db(data_dir).write() as db:
+        await db.execute("DELETE FROM job_lease WHERE name=? AND holder=?", (name, holder))
+
+
+async def get_lease(data_dir: str, name: str) -> tuple[str, int] | None:
+    """(holder, expires_at) of an unexpired lease, or None."""
+    async with _db(data_dir).read() as db:
+        async with db.execute(
+            "SELECT holder, expires_at FROM job_lease WHERE name=? AND expires_at>=?",
+            (name, int(time.time())),
+        ) as cur:
+            return await cur.fetchone()
+
+
+async def claim_trigger(
+    data_dir: str, job_id: str, fire_key: str, holder: str, keep: int = 7 * 86400
+) -> bool:
+    """
+    Claim one firing of a scheduled job for `holder`.  False if some process
+    already claimed it.  Claims older than `keep` seconds are pruned.
+    """
+    now = int(time.time())
+    async with _db(data_dir).write() as db:
+        await db.execute("DELETE FROM job_triggers WHERE claimed_at<?", (now - keep,))
+        cur = await db.execute(
+            "INSERT OR IGNORE INTO job_triggers (job_id, fire_key, holder, claimed_at) "
+            "VALUES (?, ?, ?, ?)",
+            (job_id, fire_key, holder, now),
+        )
+        return cur.rowcount > 0
@@ -7,12 +7,17 @@ Commands:
   /removechannel  – remove a channel from the scan list
   /listchannels   – show all active channels
   /settime HH:MM  – change the daily send time (UTC)
-  /sendnow        – trigger the daily job immediately
+  /addwindow HH:MM    – add an extra daily send window
+  /removewindow HH:MM – remove a send window (its channels move to the default)
+  /windows            – show send windows and the channels in each
+  /setwindow ID HH:MM – send a channel in another window (`default` = main time)
+  /sendnow        – trigger the daily job now (in the background, with progress)
   /status         – show bot state and next run time
   /search <name>  – search Telegram for channels by name
 """
 
 import logging
+import time
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from pyrogram import Client, filters
@@ -20,15 +25,27 @@ from pyrogram.types import Message
 
 from db import (
     add_channel,
+    add_send_window,
+    get_channel_windows,
     get_channels,
+    get_lease,
+    get_send_windows,
     get_setting,
     remove_channel,
+    remove_send_window,
+    set_channel_window,
     set_setting,
 )
+from peers import remember_chat, resolve_numeric
+from ratelimit import RateLimiter
+from runner import COALESCED, LEASE_NAME, LEASED, JobRunner
 from scanner import daily_job
+from scheduling import parse_time, schedule_window, unschedule_window, window_key
 
 logger = logging.getLogger(__name__)
 
+PROGRESS_INTERVAL = 3  # Min seconds between edits of the /sendnow progress message
+
 HELP_TEXT = (
     "📋 **פקודות זמינות:**\n\n"
     "➕ **הוספת ערוץ לסריקה** — שתי אפשרויות:\n"
@@ -37,6 +54,10 @@ HELP_TEXT = (
     "/removechannel `ID` — הסר ערוץ (קבל ID מ-/listchannels)\n"
     "/listchannels — ערוצים שמוגדרים לסריקה\n"
     "/settime `HH:MM` — שנה שעת שליחה יומית (UTC)\n"
+    "/addwindow `HH:MM` — הוסף חלון שליחה נוסף\n"
+    "/removewindow `HH:MM` — הסר חלון שליחה\n"
+    "/windows — חלונות שליחה והערוצים בכל אחד\n"
+    "/setwindow `ID` `HH:MM` — שייך ערוץ לחלון (`default` = השעה הראשית)\n"
     "/sendnow — שלח את הסרטון הטוב ביותר עכשיו\n"
     "/status — סטטוס הבוט\n"
     "/search `שם ערוץ` — חפש ערוץ בטלגרם"
@@ -47,15 +68,29 @@ def register_handlers(
     bot: Client,
     userbot: Client,
     scheduler: AsyncIOScheduler,
+    rate_limiter: RateLimiter,
+    runner: JobRunner,
     admin_id: int,
     target_channel: str,
     min_duration: int,
     data_dir: str,
+    prescan_lead: int = 0,
 ) -> None:
 
     # Helper: build a filter that accepts only the admin in private chat
     admin_filter = filters.private & filters.user(admin_id)
 
+    # Everything a scheduled daily_job needs, minus its window
+    job_kwargs = dict(
+        userbot=userbot,
+        bot=bot,
+        target_channel=target_channel,
+        min_duration=min_duration,
+        admin_id=admin_id,
+        data_dir=data_dir,
+        rate_limiter=rate_limiter,
+    )
+
     # ── /start ───────────────────────────────────────────────────────────────
 
     @bot.on_message(filters.command("start") & admin_filter)
@@ -68,32 +103,33 @@ def register_handlers(
         """
         Find a chat the userbot has access to.
         1. For @username  → join (public) or get_chat (already member)
-        2. For numeric ID → search dialogs directly (bypasses peer cache issues)
+        2. For numeric ID → dialog index, with a live dialog sweep on a miss
         """
         identifier = identifier.strip()
 
-        # Numeric ID path — search dialogs to get the access_hash
+        # Numeric ID path — the index holds the access_hash
         if identifier.lstrip("-").isdigit():
-            target_id = int(identifier)
-            # Strip Telegram's -100 prefix to get the raw channel id
-            raw_id = abs(target_id)
-            if str(raw_id).startswith("100"):
-                raw_id = int(str(raw_id)[3:])
-
-            async for dialog in userbot.get_dialogs():
-                did = dialog.chat.id
-                if did == target_id or abs(did) == raw_id:
-                    return dialog.chat
-
-            raise ValueError(
-                "הערוץ לא נמצא בחשבונך. ודא שהחשבון שיצר את ה-Session String מנוי לערוץ זה."
-            )
+            chat = await resolve_numeric(userbot, data_dir, identifier)
+            if chat is None:
+                raise ValueError(
+                    "הערוץ לא נמצא בחשבונך. ודא שהחשבון שיצר את ה-Session String מנוי לערוץ זה."
+                )
+            return chat
 
         # Username path — try join first, fallback to get_chat
         try:
-            return await userbot.join_chat(identifier)
+            chat = await userbot.join_chat(identifier)
         except Exception:
-            return await userbot.get_chat(identifier)
+            chat = await userbot.get_chat(identifier)
+        await remember_chat(userbot, data_dir, chat)
+        return chat
+
+    async def _find_channel(identifier: str) -> tuple[str | None, str | None]:
+        """Match an ID against stored channels — no userbot call needed."""
+        for cid, cname in await get_channels(data_dir):
+            if identifier == cid or identifier.lstrip("-") == cid.lstrip("-"):
+                return cid, cname
+        return None, None
 
     # ── Forward message → auto-add channel (easiest method) ─────────────────
 
@@ -112,7 +148,7 @@ def register_handlers(
         cache_note = ""
         try:
             lookup = f"@{chat.username}" if getattr(chat, "username", None) else chat.id
-            await userbot.get_chat(lookup)
+            await remember_chat(userbot, data_dir, await userbot.get_chat(lookup))
         except Exception as e:
             logger.warning("Peer cache warmup failed for %s: %s", chat.id, e)
             cache_note = "\n⚠️ ודא שחשבון ה-Userbot מנוי לערוץ זה."
@@ -163,15 +199,7 @@ def register_handlers(
             return
 
         identifier = parts[1].strip()
-
-        # Match against stored channels — no userbot call needed
-        channels = await get_channels(data_dir)
-        match_id, match_name = None, None
-        for cid, cname in channels:
-            if identifier == cid or identifier.lstrip("-") == cid.lstrip("-"):
-                match_id, match_name = cid, cname
-                break
-
+        match_id, match_name = await _find_channel(identifier)
         if match_id is None:
             await msg.reply(
                 f"⚠️ לא נמצא ערוץ עם ID `{identifier}` ברשימה.\n"
@@ -221,45 +249,148 @@ def register_handlers(
             await msg.reply("שימוש: `/settime HH:MM`  (זמן UTC)\nדוגמה: `/settime 18:30`")
             return
 
-        time_str = parts[1].strip()
-        try:
-            h, m = time_str.split(":")
-            hour, minute = int(h), int(m)
-            if not (0 <= hour <= 23 and 0 <= minute <= 59):
-                raise ValueError
-        except ValueError:
+        parsed = parse_time(parts[1])
+        if parsed is None:
             await msg.reply("❌ פורמט שגוי. השתמש ב-`HH:MM` (לדוגמה: `18:30`).")
             return
+        hour, minute = parsed
 
         await set_setting(data_dir, "send_hour", str(hour))
         await set_setting(data_dir, "send_minute", str(minute))
 
-        # Update the live scheduler job
-        scheduler.reschedule_job(
-            "daily_send",
-            trigger="cron",
-            hour=hour,
-            minute=minute,
-        )
+        # Update the live scheduler jobs (send + pre-scan)
+        schedule_window(scheduler, runner, None, hour, minute, prescan_lead, **job_kwargs)
 
         await msg.reply(
             f"⏰ שעת שליחה עודכנה: **{hour:02d}:{minute:02d} UTC**\n"
             f"(ישראל = UTC+2 בחורף, UTC+3 בקיץ)"
         )
 
+    # ── Send windows ─────────────────────────────────────────────────────────
+
+    @bot.on_message(filters.command("addwindow") & admin_filter)
+    async def cmd_add_window(_: Client, msg: Message) -> None:
+        parts  = msg.text.split(maxsplit=1)
+        parsed = parse_time(parts[1]) if len(parts) > 1 else None
+        if parsed is None:
+            await msg.reply("שימוש: `/addwindow HH:MM`  (זמן UTC)\nדוגמה: `/addwindow 08:00`")
+            return
+
+        window = window_key(*parsed)
+        if not await add_send_window(data_dir, window):
+            await msg.reply(f"ℹ️ חלון **{window}** כבר קיים.")
+            return
+        schedule_window(scheduler, runner, window, *parsed, prescan_lead, **job_kwargs)
+        await msg.reply(
+            f"✅ חלון שליחה נוסף: **{window} UTC**\n"
+            f"שייך אליו ערוצים עם `/setwindow ID {window}`."
+        )
+
+    @bot.on_message(filters.command("removewindow") & admin_filter)
+    async def cmd_remove_window(_: Client, msg: Message) -> None:
+        parts  = msg.text.split(maxsplit=1)
+        parsed = parse_time(parts[1]) if len(parts) > 1 else None
+        if parsed is None:
+            await msg.reply("שימוש: `/removewindow HH:MM`")
+            return
+
+        window = window_key(*parsed)
+        if not await remove_send_window(data_dir, window):
+            await msg.reply(f"⚠️ אין חלון שליחה **{window}**. ראה /windows.")
+            return
+        unschedule_window(scheduler, window)
+        await msg.reply(f"✅ חלון **{window}** הוסר. הערוצים שלו עברו לשעה הראשית.")
+
+    @bot.on_message(filters.command("setwindow") & admin_filter)
+    async def cmd_set_window(_: Client, msg: Message) -> None:
+        parts = msg.text.split()
+        if len(parts) < 3:
+            await msg.reply(
+                "שימוש: `/setwindow -1001234567890 08:00`\n"
+                "או `/setwindow -1001234567890 default` לשעה הראשית."
+            )
+            return
+
+        match_id, match_name = await _find_channel(parts[1])
+        if match_id is None:
+            await msg.reply(f"⚠️ לא נמצא ערוץ עם ID `{parts[1]}`. ראה /listchannels.")
+            return
+
+        window = None
+        if parts[2].lower() != "default":
+            parsed = parse_time(parts[2])
+            window = window_key(*parsed) if parsed else None
+            if window not in await get_send_windows(data_dir):
+                await msg.reply(f"⚠️ אין חלון שליחה `{parts[2]}`. הוסף עם /addwindow.")
+                return
+
+        await set_channel_window(data_dir, match_id, window)
+        await msg.reply(f"✅ **{match_name}** יישלח ב-{window or 'שעה הראשית'}.")
+
+    @bot.on_message(filters.command("windows") & admin_filter)
+    async def cmd_windows(_: Client, msg: Message) -> None:
+        send_hour   = int(await get_setting(data_dir, "send_hour",   "12"))
+        send_minute = int(await get_setting(data_dir, "send_minute", "0"))
+
+        by_window: dict[str | None, list[str]] = {}
+        for _, cname, window in await get_channel_windows(data_dir):
+            by_window.setdefault(window, []).append(cname)
+
+        lines = [f"⏰ **{send_hour:02d}:{send_minute:02d}** (ראשי): "
+                 f"{len(by_window.get(None, []))} ערוצים"]
+        for window in await get_send_windows(data_dir):
+            names = by_window.get(window, [])
+            lines.append(f"⏰ **{window}**: {len(names)} ערוצים"
+                         + (f" — {', '.join(names)}" if names else ""))
+        await msg.reply("🪟 **חלונות שליחה (UTC):**\n\n" + "\n".join(lines))
+
     # ── /sendnow ─────────────────────────────────────────────────────────────
 
+    async def _send_all_windows(status: Message) -> None:
+        """Every window, one after the other, editing `status` as channels finish."""
+        last_edit = 0.0
+
+        for window in [None, *await get_send_windows(data_dir)]:
+            label = f"חלון {window}" if window else "שעה ראשית"
+
+            async def progress(done: int, total: int, sent: int, label: str = label) -> None:
+                nonlocal last_edit
+                # Throttled so a fast scan doesn't hit the bot's edit rate limit
+                if done < total and time.monotonic() - last_edit < PROGRESS_INTERVAL:
+                    return
+                last_edit = time.monotonic()
+                try:
+                    await status.edit_text(
+                        f"🔍 {label}: נסרקו {done}/{total} ערוצים, נשלחו {sent} סרטונים..."
+                    )
+                except Exception as e:
+                    logger.debug("Progress edit failed: %s", e)
+
+            await daily_job(**job_kwargs, window=window, progress=progress)
+
+        await status.edit_text("✅ הריצה הידנית הסתיימה.")
+
+    async def _manual_run(status: Message) -> None:
+        outcome = await runner.run("sendnow", lambda: _send_all_windows(status))
+        if outcome == COALESCED:
+            await status.edit_text("⏳ /sendnow כבר ממתין בתור — לא נוספה ריצה נוספת.")
+        elif outcome == LEASED:
+            await status.edit_text("⏸ ריצה פעילה במופע אחר של הבוט — דילגתי.")
+
     @bot.on_message(filters.command("sendnow") & admin_filter)
     async def cmd_send_now(_: Client, msg: Message) -> None:
-        await msg.reply("🔍 סורק ערוצים...")
-        await daily_job(
-            userbot=userbot,
-            bot=bot,
-            target_channel=target_channel,
-            min_duration=min_duration,
-            admin_id=admin_id,
-            data_dir=data_dir,
+        if runner.is_queued("sendnow"):
+            await msg.reply("⏳ /sendnow כבר ממתין בתור.")
+            return
+
+        # The job runs in the background (after any run in flight); this
+        # handler returns right away
+        text = (
+            f"⏳ נכנס לתור אחרי הריצה הנוכחית ({runner.current or '...'})."
+            if runner.busy else "🔍 סורק ערוצים..."
         )
+        status = await msg.reply(text)
+        runner.spawn(_manual_run(status))
 
     # ── /status ──────────────────────────────────────────────────────────────
 
@@ -271,6 +402,18 @@ def register_handlers(
 
         job = scheduler.get_job("daily_send")
         next_run = str(job.next_run_time) if job else "לא מתוזמן"
+        prescan_job = scheduler.get_job("daily_prescan")
+        windows = await get_send_windows(data_dir)
+        windows_line = f"🪟 חלונות נוספים: {', '.join(windows)}\n" if windows else ""
+        lease = await get_lease(data_dir, LEASE_NAME)
+        lease_line = (
+            f"🔒 נעילת ריצה אצל מופע אחר: `{lease[0]}`\n"
+            if lease and lease[0] != runner.holder else ""
+        )
+        prescan_line = (
+            f"🔎 סריקה מוקדמת: `{prescan_job.next_run_time}` ({prescan_lead} דק' לפני)\n"
+            if prescan_job else ""
+        )
 
         await msg.reply(
             f"📊 **סטטוס בוט**\n\n"
@@ -278,7 +421,12 @@ def register_handlers(
             f"📺 ערוצים פעילים: **{len(channels)}**\n"
             f"⏰ שעת שליחה: **{int(send_hour):02d}:{int(send_minute):02d} UTC**\n"
             f"🕐 ריצה הבאה: `{next_run}`\n"
-            f"🎬 מינימום אורך וידאו: {min_duration // 60} דקות"
+            f"{windows_line}"
+            f"{prescan_line}"
+            f"🎬 מינימום אורך וידאו: {min_duration // 60} דקות\n"
+            f"🚦 Userbot API: {rate_limiter.summary()}\n"
+            f"🏃 ריצה נוכחית: {runner.summary()}\n"
+            f"{lease_line}"
         )
 
     # ── /search ──────────────────────────────────────────────────────────────
@@ -12,6 +12,9 @@ Required environment variables (set in Railway or .env locally):
 Optional:
   MIN_DURATION    – Minimum video length in seconds (default: 300 = 5 min)
   DATA_DIR        – Folder for SQLite file (default: /data for Railway)
+  PRESCAN_LEAD_MINUTES – Scan this many minutes before the send time so the
+                    send itself is near-instant (default: 0 = scan at send time;
+                    at most 359, so the send job can still resume the pre-scan)
 """
 
 import asyncio
@@ -21,9 +24,13 @@ import os
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from pyrogram import Client
 
-from db import get_setting, init_db
+from db import close_db, get_interrupted_runs, get_send_windows, get_setting, init_db
 from handlers import register_handlers
-from scanner import daily_job
+from peers import background_sweep, hydrate_channels, sync_dialogs
+from ratelimit import RateLimiter
+from runner import JobRunner
+from scanner import RESUME_WINDOW
+from scheduling import parse_time, resume_window, schedule_window
 
 logging.basicConfig(
     level=logging.INFO,
@@ -49,6 +56,15 @@ async def main() -> None:
     target_channel = _require("TARGET_CHANNEL")
     min_duration   = int(os.environ.get("MIN_DURATION", "300"))
     data_dir       = os.environ.get("DATA_DIR", "/data")
+    prescan_lead   = int(os.environ.get("PRESCAN_LEAD_MINUTES", "0"))
+
+    # The send job can only pick up a pre-scan that is still resumable
+    # (and a lead of a day or more would wrap onto another day's send)
+    max_lead = RESUME_WINDOW // 60 - 1
+    if not 0 <= prescan_lead <= max_lead:
+        raise RuntimeError(
+            f"PRESCAN_LEAD_MINUTES must be between 0 and {max_lead}, got {prescan_lead}"
+        )
 
     # ── DB ───────────────────────────────────────────────────────────────────
     await init_db(data_dir)
@@ -56,6 +72,7 @@ async def main() -> None:
     # Load saved schedule (or fall back to noon UTC)
     send_hour   = int(await get_setting(data_dir, "send_hour",   "12"))
     send_minute = int(await get_setting(data_dir, "send_minute", "0"))
+    windows     = await get_send_windows(data_dir)
 
     # ── Clients ──────────────────────────────────────────────────────────────
     userbot = Client(
@@ -68,6 +85,10 @@ async def main() -> None:
         # over the session_string, which can lead to BOT_METHOD_INVALID errors.
     )
 
+    # Every userbot request is paced by one shared, FloodWait-aware bucket
+    rate_limiter = RateLimiter()
+    rate_limiter.attach(userbot)
+
     bot = Client(
         name="bot",
         api_id=api_id,
@@ -78,11 +99,14 @@ async def main() -> None:
 
     # ── Scheduler ────────────────────────────────────────────────────────────
     scheduler = AsyncIOScheduler(timezone="UTC")
-
-    # ── Start userbot FIRST and sync dialogs BEFORE bot starts ───────────────
-    # This is critical: when both clients run together, pyrofork can confuse
-    # which session to use, causing get_dialogs() to route through the bot
-    # and fail with BOT_METHOD_INVALID.
+    runner    = JobRunner(data_dir)  # Cron jobs and /sendnow never overlap
+
+    # ── Start userbot FIRST and load its peers BEFORE bot starts ─────────────
+    # The userbot must be up (and its channel peers known) before the bot
+    # starts taking commands.  Dialog sweeps themselves are safe once both
+    # clients run: the BOT_METHOD_INVALID they used to hit came from the
+    # userbot picking up a stale .session file (see the Client above), and
+    # /addchannel has always swept dialogs with the bot running.
     logger.info("Starting userbot...")
     await userbot.start()
 
@@ -100,60 +124,78 @@ async def main() -> None:
     except Exception as e:
         logger.error("Could not identify userbot account: %s", e)
 
-    logger.info("Syncing dialogs (populating peer cache)...")
-    dialog_count = 0
+    # Re-hydrate only the peers a run needs (active channels and the target)
+    # from the dialog index; the full dialog sweep runs in the background once
+    # the bot is up.  The session lives in memory, so if one of them isn't
+    # indexed yet, sweep now: no run (resumed, cron or /sendnow) may start
+    # before it can reach the channels and the target.
+    hydrated, peer_count = 0, 0
+    swept = False
+    missing = True
     try:
-        # Use explicit limit — pyrofork's limit=0 default may return nothing
-        async for _ in userbot.get_dialogs(limit=500):
-            dialog_count += 1
-        logger.info("Dialogs synced: %d chats cached.", dialog_count)
-        # Also sweep archived chats (folder_id=1) if regular dialogs were empty
-        if dialog_count == 0:
-            logger.warning("No dialogs in main folder — trying archived folder...")
-            async for _ in userbot.get_dialogs(limit=500, folder_id=1):
-                dialog_count += 1
-            logger.info("After archive sweep: %d chats cached.", dialog_count)
+        hydrated, peer_count = await hydrate_channels(userbot, data_dir, target_channel)
+        logger.info("Peer cache re-hydrated: %d/%d channels (incl. target).", hydrated, peer_count)
+        missing = hydrated < peer_count
     except Exception as e:
-        logger.error("Dialog sync FAILED: %s — channel scanning may not work!", e)
+        logger.error("Peer re-hydration FAILED: %s", e)
+    if missing:
+        logger.info("Syncing dialogs (populating peer cache and dialog index)...")
+        try:
+            dialog_count = await sync_dialogs(userbot, data_dir)
+            swept = True
+            logger.info("Dialogs synced: %d chats cached.", dialog_count)
+        except Exception as e:
+            logger.error("Dialog sync FAILED: %s — channel scanning may not work!", e)
 
     # ── Now start the bot ─────────────────────────────────────────────────────
     logger.info("Starting bot...")
     await bot.start()
 
+    sweep: asyncio.Task | None = None
     try:
         # Register all command handlers
         register_handlers(
             bot=bot,
             userbot=userbot,
             scheduler=scheduler,
+            rate_limiter=rate_limiter,
+            runner=runner,
             admin_id=admin_id,
             target_channel=target_channel,
             min_duration=min_duration,
             data_dir=data_dir,
+            prescan_lead=prescan_lead,
         )
 
-        # Daily job
-        scheduler.add_job(
-            daily_job,
-            trigger="cron",
-            hour=send_hour,
-            minute=send_minute,
-            id="daily_send",
-            replace_existing=True,
-            kwargs=dict(
-                userbot=userbot,
-                bot=bot,
-                target_channel=target_channel,
-                min_duration=min_duration,
-                admin_id=admin_id,
-                data_dir=data_dir,
-            ),
+        # One send job (and pre-scan) per window: the default send time plus
+        # any extra windows; each one scans only the channels assigned to it
+        job_kwargs = dict(
+            userbot=userbot,
+            bot=bot,
+            target_channel=target_channel,
+            min_duration=min_duration,
+            admin_id=admin_id,
+            data_dir=data_dir,
+            rate_limiter=rate_limiter,
         )
+        schedule_window(scheduler, runner, None, send_hour, send_minute, prescan_lead, **job_kwargs)
+        for window in windows:
+            hour, minute = parse_time(window)
+            schedule_window(scheduler, runner, window, hour, minute, prescan_lead, **job_kwargs)
 
         scheduler.start()
+
+        # A send run cut short by the restart resumes now rather than never:
+        # APScheduler won't re-fire the cron job it missed
+        for window, run_id in await get_interrupted_runs(data_dir, RESUME_WINDOW):
+            if window is None or window in windows:
+                logger.info("Resuming interrupted run %d (window %s).", run_id, window or "default")
+                resume_window(runner, window, run_id, **job_kwargs)
+        if not swept:
+            sweep = asyncio.create_task(background_sweep(userbot, data_dir))
         logger.info(
-            "Bot started. Daily job at %02d:%02d UTC. Dialogs cached: %d",
-            send_hour, send_minute, dialog_count,
+            "Bot started. Daily job at %02d:%02d UTC (+%d extra windows). Peers loaded: %d/%d",
+            send_hour, send_minute, len(windows), hydrated, peer_count,
         )
 
         # Notify admin
@@ -162,8 +204,9 @@ async def main() -> None:
                 admin_id,
                 f"🟢 הבוט עלה!\n"
                 f"👤 Userbot: {userbot_name} (ID: `{userbot_id}`)\n"
-                f"💾 ערוצים בזיכרון: {dialog_count}\n"
-                f"⏰ שליחה יומית: {send_hour:02d}:{send_minute:02d} UTC",
+                f"💾 ערוצים בזיכרון: {hydrated}/{peer_count}\n"
+                f"⏰ שליחה יומית: {send_hour:02d}:{send_minute:02d} UTC"
+                + "".join(f", {w}" for w in windows),
             )
         except Exception as e:
             logger.warning("Could not send startup message: %s", e)
@@ -172,9 +215,12 @@ async def main() -> None:
         await asyncio.Event().wait()
 
     finally:
+        if sweep is not None:
+            sweep.cancel()
         scheduler.shutdown(wait=False)
         await bot.stop()
         await userbot.stop()
+        await close_db(data_dir)
 
 
 if __name__ == "__main__":
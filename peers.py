@@ -0,0 +1,156 @@
+"""
+Dialog index — the userbot's chats persisted in the dialogs table.
+
+Pyrogram can only talk to a channel whose access_hash it knows, which is
+why the bot used to walk the whole dialog list to resolve a numeric ID.
+Every sweep (at startup, and on an index miss) now records each chat's id,
+access_hash, type, title and username, and chats resolved any other way
+(forwarded messages, @usernames) are added as they come.  A numeric ID is
+then looked up in O(1) and its peer handed straight to Pyrogram's storage.
+
+At startup only the peers a run needs — the active channels and a numeric
+target channel — are re-hydrated from the index (hydrate_channels), so boot
+time grows with the channel list rather than the account's dialog count;
+the full sweep runs later in the background (or before the bot starts,
+when one of those peers isn't indexed yet).
+"""
+
+import asyncio
+import logging
+
+from pyrogram import Client, utils
+from pyrogram.enums import ChatType
+from pyrogram.types import Chat
+
+from db import get_channels, get_dialog, get_dialog_rows, save_dialogs
+
+logger = logging.getLogger(__name__)
+
+DIALOG_LIMIT = 500  # Max dialogs read per sweep (explicit: limit=0 may return nothing)
+SAVE_BATCH   = 100  # Dialog rows written to the index per transaction
+SWEEP_DELAY  = 120  # Seconds after startup before the background dialog sweep
+
+# ChatType → the peer type Pyrogram's own storage uses
+_PEER_TYPES = {
+    ChatType.PRIVATE: "user",
+    ChatType.BOT:     "bot",
+    ChatType.GROUP:   "group",
+    ChatType.CHANNEL: "channel",
+}
+
+Dialog = tuple[int, int, str, str | None, str | None]  # chat_id, access_hash, peer_type, title, username
+
+
+async def _dialog_row(userbot: Client, chat: Chat) -> Dialog | None:
+    # The access_hash was stored by Pyrogram when the chat was fetched — local read
+    try:
+        peer = await userbot.storage.get_peer_by_id(chat.id)
+    except KeyError:
+        return None
+    return (
+        chat.id,
+        getattr(peer, "access_hash", 0),
+        _PEER_TYPES.get(chat.type, "supergroup"),
+        chat.title or chat.first_name,
+        chat.username,
+    )
+
+
+async def remember_chat(userbot: Client, data_dir: str, chat: Chat) -> None:
+    """Add (or refresh) one chat in the index."""
+    try:
+        row = await _dialog_row(userbot, chat)
+        if row:
+            await save_dialogs(data_dir, [row])
+    except Exception as e:
+        logger.warning("Could not index chat %s: %s", chat.id, e)
+
+
+async def sync_dialogs(
+    userbot: Client, data_dir: str, targets: set[int] | None = None
+) -> Chat | int:
+    """
+    Sweep the userbot's dialogs into the index (and Pyrogram's peer cache).
+
+    With `targets` the sweep stops at the first chat whose id is in it and
+    returns that chat; otherwise it returns the number of dialogs seen.
+    """
+    count = 0
+    batch: list[Dialog] = []
+    try:
+        async for dialog in userbot.get_dialogs(limit=DIALOG_LIMIT):
+            count += 1
+            if row := await _dialog_row(userbot, dialog.chat):
+                batch.append(row)
+            if len(batch) >= SAVE_BATCH:
+                await save_dialogs(data_dir, batch)
+                batch.clear()
+            if targets and dialog.chat.id in targets:
+                return dialog.chat
+    finally:
+        if batch:
+            await save_dialogs(data_dir, batch)
+    return count
+
+
+def _candidate_ids(identifier: str) -> list[int]:
+    """A numeric ID as typed (-100…, -…, or the bare channel id) → possible chat ids."""
+    target_id = int(identifier)
+    ids = [target_id]
+    if target_id > 0:
+        ids.append(utils.get_channel_id(target_id))  # Bare channel id → -100…
+        ids.append(-target_id)                       # …or a basic group
+    return ids
+
+
+async def resolve_numeric(userbot: Client, data_dir: str, identifier: str) -> Chat | None:
+    """
+    Resolve a numeric chat ID: index lookup first, a live dialog sweep only
+    on a miss.  Returns None if the userbot has no such chat.
+    """
+    ids = _candidate_ids(identifier)
+
+    row = await get_dialog(data_dir, ids)
+    if row:
+        chat_id, access_hash, peer_type, _, username = row
+        # Hand the stored peer to Pyrogram so get_chat needs no dialog sweep
+        await userbot.storage.update_peers([(chat_id, access_hash, peer_type, username, None)])
+        try:
+            chat = await userbot.get_chat(chat_id)
+        except Exception as e:
+            logger.info("Indexed chat %s is stale (%s) — sweeping dialogs.", chat_id, e)
+        else:
+            await remember_chat(userbot, data_dir, chat)
+            return chat
+
+    chat = await sync_dialogs(userbot, data_dir, set(ids))
+    return chat if isinstance(chat, Chat) else None
+
+
+async def hydrate_channels(
+    userbot: Client, data_dir: str, target: str | None = None
+) -> tuple[int, int]:
+    """
+    Load the active channels' peers — and the target's, when it is given by
+    numeric ID (an @username resolves on its own) — from the index into
+    Pyrogram's storage.  Returns (hydrated, peers needed).
+    """
+    chat_ids = {int(cid) for cid, _ in await get_channels(data_dir)}
+    if target and target.lstrip("-").isdigit():
+        chat_ids.add(int(target))
+    rows = await get_dialog_rows(data_dir, list(chat_ids))
+    await userbot.storage.update_peers(
+        [(chat_id, access_hash, peer_type, username, None)
+         for chat_id, access_hash, peer_type, _, username in rows]
+    )
+    return len(rows), len(chat_ids)
+
+
+async def background_sweep(userbot: Client, data_dir: str, delay: float = SWEEP_DELAY) -> None:
+    """Full dialog sweep off the startup path: refreshes the index and peer cache."""
+    await asyncio.sleep(delay)
+    try:
+        count = await sync_dialogs(userbot, data_dir)
+        logger.info("Background dialog sweep done: %d chats indexed.", count)
+    except Exception as e:
+        logger.warning("Background dialog sweep failed: %s", e)
@@ -0,0 +1,76 @@
+"""
+Candidate ranking — picks the best videos across all channels.
+
+Scans push candidates into a TopK as they find them.  Each channel keeps a
+bounded min-heap, so memory stays at channels × cap however many messages
+are scanned, and selection costs O(n log k).  result() then pops the pooled
+heaps best-first, applying the global cap and skipping duplicate videos.
+"""
+
+import heapq
+from itertools import count
+from typing import Callable, Generic, Hashable, Iterable, TypeVar
+
+T = TypeVar("T")
+
+DUPLICATE_SPARE = 2  # Extra slots per channel so a skipped duplicate can fall through
+
+
+class TopK(Generic[T]):
+    """Streaming top-k with a per-channel cap and an optional global cap (0 = none)."""
+
+    def __init__(self, per_channel: int, total: int = 0, spare: int = DUPLICATE_SPARE) -> None:
+        if per_channel <= 0 and total <= 0:
+            raise ValueError("TopK needs a per-channel cap, a global cap, or both")
+        self.per_channel = per_channel
+        self.total       = total
+        caps = [c for c in (per_channel, total) if c > 0]
+        self._capacity   = min(caps) + spare
+        self._heaps: dict[Hashable, list[tuple[float, int, T]]] = {}
+        self._order = count()  # Tie-breaker so items themselves are never compared
+
+    def push(self, channel: Hashable, score: float, item: T) -> None:
+        heap  = self._heaps.setdefault(channel, [])
+        entry = (score, next(self._order), item)
+        if len(heap) < self._capacity:
+            heapq.heappush(heap, entry)
+        elif entry[0] > heap[0][0]:
+            heapq.heapreplace(heap, entry)
+
+    def items(self) -> dict[Hashable, list[T]]:
+        """Every item still held (the shortlist), by channel, in no particular order."""
+        return {channel: [item for _, _, item in heap] for channel, heap in self._heaps.items()}
+
+    def result(
+        self,
+        keys: Callable[[T], Iterable[str | None]] = lambda _: (),
+        seen: set[str] | None = None,
+    ) -> list[tuple[Hashable, T]]:
+        """
+        (channel, item) pairs, best first, within both caps.
+
+        An item whose keys (file_unique_id, fingerprint, …) are already in
+        `seen` is skipped; the keys of every picked item are added to it, so
+        only the best-ranked copy of a duplicated video survives.
+        """
+        seen = set() if seen is None else seen
+        pool = [
+            (-score, order, channel, item)
+            for channel, heap in self._heaps.items()
+            for score, order, item in heap
+        ]
+        heapq.heapify(pool)
+
+        picked: list[tuple[Hashable, T]] = []
+        per_channel: dict[Hashable, int] = {}
+        while pool and (self.total <= 0 or len(picked) < self.total):
+            _, _, channel, item = heapq.heappop(pool)
+            if self.per_channel > 0 and per_channel.get(channel, 0) >= self.per_channel:
+                continue
+            item_keys = [k for k in keys(item) if k]
+            if any(k in seen for k in item_keys):
+                continue
+            seen.update(item_keys)
+            per_channel[channel] = per_channel.get(channel, 0) + 1
+            picked.append((channel, item))
+        return picked
@@ -0,0 +1,119 @@
+"""
+Userbot rate limiter — one token bucket shared by every userbot request.
+
+attach() wraps Client.invoke, which all high-level Pyrogram methods
+(get_chat_history, copy_message, get_chat, get_dialogs, raw invokes such as
+contacts.Search) go through.  FloodWait errors are no longer slept on
+privately inside Pyrogram: the limiter pauses *every* caller for the time
+Telegram asked for, halves its rate, retries the call, and creeps the rate
+back up after a run of successful calls.
+"""
+
+import asyncio
+import logging
+import time
+
+from pyrogram import Client
+from pyrogram.errors import FloodWait
+
+logger = logging.getLogger(__name__)
+
+RATE           = 20.0  # Calls per second while Telegram is happy
+MIN_RATE       = 1.0   # Floor the rate backs off to after repeated FloodWaits
+BURST          = 10    # Calls that may go out back-to-back
+MAX_RETRIES    = 3     # FloodWait retries per call before the error is raised
+MAX_WAIT       = 300   # FloodWaits longer than this (seconds) are raised, not slept
+RECOVER_AFTER  = 50    # Successful calls before the rate is nudged back up
+RECOVER_FACTOR = 1.25  # Growth per recovery step (capped at RATE)
+
+
+class RateLimiter:
+    """Adaptive token bucket that honours FloodWait across all callers."""
+
+    def __init__(self, rate: float = RATE, burst: int = BURST) -> None:
+        self.max_rate = rate
+        self.rate     = rate
+        self.burst    = burst
+
+        self._tokens       = float(burst)
+        self._updated      = time.monotonic()
+        self._paused_until = 0.0
+        self._streak       = 0
+        self._lock         = asyncio.Lock()
+
+        # Counters (read by /status)
+        self.calls       = 0
+        self.flood_waits = 0
+        self.retries     = 0
+        self.waited      = 0.0  # Seconds spent paused on FloodWait (overlapping pauses once)
+
+    async def acquire(self) -> None:
+        """Wait for a free token (and for any FloodWait pause to end)."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens  = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def _on_success(self) -> None:
+        self._streak += 1
+        if self._streak >= RECOVER_AFTER and self.rate < self.max_rate:
+            self.rate    = min(self.max_rate, self.rate * RECOVER_FACTOR)
+            self._streak = 0
+
+    def _on_flood(self, seconds: int) -> None:
+        now   = time.monotonic()
+        until = now + seconds
+        self.flood_waits += 1
+        if until > self._paused_until:
+            # Only the part not already covered by a running pause
+            self.waited       += until - max(now, self._paused_until)
+            self._paused_until = until
+        self._tokens       = 0.0
+        self._streak       = 0
+        self.rate          = max(MIN_RATE, self.rate / 2)
+
+    def attach(self, client: Client) -> None:
+        """Route every request made by `client` through this limiter."""
+        invoke = client.invoke
+
+        async def limited_invoke(query, *args, **kwargs):
+            # Pyrogram would otherwise sleep on short FloodWaits by itself,
+            # hiding them from the other callers sharing this bucket.
+            args = args[:2]
+            kwargs["sleep_threshold"] = 0
+
+            for attempt in range(MAX_RETRIES + 1):
+                await self.acquire()
+                self.calls += 1
+                try:
+                    result = await invoke(query, *args, **kwargs)
+                except FloodWait as e:
+                    wait = int(e.value or 1)
+                    if wait > MAX_WAIT or attempt == MAX_RETRIES:
+                        raise
+                    self._on_flood(wait)
+                    self.retries += 1
+                    logger.warning(
+                        "FloodWait %ds on %s — pausing, rate now %.1f/s (retry %d/%d).",
+                        wait, type(query).__name__, self.rate, attempt + 1, MAX_RETRIES,
+                    )
+                    continue
+                self._on_success()
+                return result
+
+        client.invoke = limited_invoke
+
+    def summary(self) -> str:
+        return (
+            f"{self.calls} calls, {self.flood_waits} FloodWaits "
+            f"({self.waited:.0f}s), rate {self.rate:.1f}/s"
+        )
@@ -0,0 +1,169 @@
+"""
+Single-flight job runner — at most one daily_job run in flight at a time.
+
+Cron jobs (every send window and pre-scan) and /sendnow all go through one
+JobRunner, so two runs never scan and forward the same channels at once:
+
+  • Inside the process an asyncio lock serialises runs: a trigger that
+    arrives while another run is in flight waits its turn in the queue.
+  • A trigger whose label is already waiting in the queue is coalesced
+    into it instead of queueing a second identical run.
+  • Across processes (two replicas sharing one bot.db) a lease row in the
+    job_lease table decides who runs; it is renewed while the job runs and
+    expires by itself if the holder dies.
+  • Scheduled triggers go through run_once, which first claims the
+    (job id, fire time) pair in job_triggers: however the replicas' runs
+    fall in time, each firing runs once.  A claimed trigger that finds the
+    lease taken waits for it (up to LEASE_WAIT) instead of being dropped,
+    so a lease left behind by a killed process only delays the run.
+
+/sendnow hands its work to the runner and returns straight away, so no
+Pyrogram handler worker is tied up for the minutes a scan takes.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+from typing import Awaitable, Callable, Coroutine
+
+from db import acquire_lease, claim_trigger, release_lease
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME  = "daily_job"
+LEASE_TTL   = 180   # Seconds the lease outlives its holder if it stops renewing
+LEASE_RENEW = 60    # Seconds between renewals while a run is in flight
+LEASE_RETRY = 30    # Seconds between lease attempts of a scheduled run
+LEASE_WAIT  = 3600  # Seconds a scheduled run waits for the lease before giving up
+
+# run() outcomes
+RAN       = "ran"
+COALESCED = "coalesced"  # An identical trigger was already waiting
+LEASED    = "leased"     # Another process holds the lease
+CLAIMED   = "claimed"    # Another process already ran this scheduled trigger
+
+
+class JobRunner:
+    """Serialises job runs in this process and, via a DB lease, across processes."""
+
+    def __init__(self, data_dir: str) -> None:
+        self.data_dir = data_dir
+        self.holder   = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._lock = asyncio.Lock()
+        self._queued: list[str] = []  # Labels waiting for the lock, in order
+        self._tasks: set[asyncio.Task] = set()
+
+        self.current: str | None = None  # Label of the run in flight
+        self.started_at = 0.0
+
+        # Counters (read by /status)
+        self.runs      = 0
+        self.coalesced = 0
+        self.leased    = 0
+        self.claimed   = 0
+
+    @property
+    def busy(self) -> bool:
+        return self.current is not None or bool(self._queued)
+
+    def is_queued(self, label: str) -> bool:
+        return label in self._queued
+
+    async def run_once(
+        self, label: str, job: Callable[[], Awaitable[None]], key: str | None = None
+    ) -> str:
+        """
+        Scheduled entry point: run `job` for (label, key) once across every
+        process sharing the DB.  Cron jobs leave `key` at its default, the
+        minute they fired (APScheduler runs them within a second of it);
+        a resumed run passes its own key.  Returns CLAIMED if another
+        process got there first, else like run(), waiting for the lease.
+        """
+        if key is None:
+            key = time.strftime("%Y-%m-%d %H:%M", time.gmtime())
+        if not await claim_trigger(self.data_dir, label, key, self.holder):
+            self.claimed += 1
+            logger.info("Run %r (%s) was already claimed by another instance.", label, key)
+            return CLAIMED
+        return await self.run(label, job, wait=LEASE_WAIT)
+
+    async def run(
+        self, label: str, job: Callable[[], Awaitable[None]], wait: float = 0
+    ) -> str:
+        """
+        Run `job` once no other run is in flight; returns RAN, COALESCED or
+        LEASED.  With `wait`, a lease held elsewhere is retried every
+        LEASE_RETRY seconds for up to that long before giving up.
+        """
+        if label in self._queued:
+            self.coalesced += 1
+            logger.info("Run %r is already queued — trigger coalesced.", label)
+            return COALESCED
+
+        if self._lock.locked():
+            logger.info("Run %r queued behind %r.", label, self.current)
+        self._queued.append(label)
+        try:
+            await self._lock.acquire()
+        finally:
+            self._queued.remove(label)
+
+        self.current    = label
+        self.started_at = time.monotonic()
+        try:
+            deadline = time.monotonic() + wait
+            waiting  = False
+            while not await acquire_lease(self.data_dir, LEASE_NAME, self.holder, LEASE_TTL):
+                if time.monotonic() >= deadline:
+                    self.leased += 1
+                    logger.warning("Run %r skipped — another instance holds the job lease.", label)
+                    return LEASED
+                if not waiting:
+                    waiting = True
+                    logger.info("Run %r waiting for the job lease held by another instance.", label)
+                await asyncio.sleep(LEASE_RETRY)
+
+            renewer = asyncio.create_task(self._renew())
+            try:
+                await job()
+            except Exception:
+                logger.exception("Run %r failed.", label)
+            finally:
+                renewer.cancel()
+                await release_lease(self.data_dir, LEASE_NAME, self.holder)
+                logger.info("Run %r finished in %.0fs.", label, time.monotonic() - self.started_at)
+                self.runs += 1
+            return RAN
+        finally:
+            self.current = None
+            self._lock.release()
+
+    async def _renew(self) -> None:
+        while True:
+            await asyncio.sleep(LEASE_RENEW)
+            try:
+                await acquire_lease(self.data_dir, LEASE_NAME, self.holder, LEASE_TTL)
+            except Exception as e:
+                logger.warning("Could not renew job lease: %s", e)
+
+    def spawn(self, coro: Coroutine) -> asyncio.Task:
+        """Run `coro` in the background, keeping a reference until it ends."""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def summary(self) -> str:
+        if self.current is None:
+            state = "idle"
+        else:
+            state = f"{self.current} ({time.monotonic() - self.started_at:.0f}s)"
+        if self._queued:
+            state += f", queued: {', '.join(self._queued)}"
+        return (
+            f"{state} — {self.runs} runs, {self.coalesced} coalesced, "
+            f"{self.leased} skipped (lease), {self.claimed} ran elsewhere"
+        )
@@ -2,22 +2,759 @@
 Channel scanner — finds the top videos across all active channels.
 
 For each channel: collect all qualifying videos from the last 24 hours,
-sort by views descending, and forward up to VIDEOS_PER_CHANNEL.
+score them with the SCORING function from scoring.py, and stream them into
+a ranking.TopK, which keeps up to VIDEOS_PER_CHANNEL per channel and, if
+MAX_VIDEOS_TOTAL is set, the best that many overall.
+
+  • Each channel's history is streamed through a generator pipeline that
+    reduces every video to a slotted candidates.Candidate and stops paging
+    at the lookback cutoff.  With SCAN_MODE "search" Telegram itself
+    filters the history down to videos posted since the cutoff, so text
+    posts are never downloaded and busy channels are covered for the whole
+    window; "history" pages through every message (up to SCAN_LIMIT).
+    With RAW_SCAN the pages are read as raw TL objects and only the fields
+    a Candidate needs are pulled out, instead of building full pyrogram
+    Message objects for every post.  The next page is always prefetched
+    (PREFETCH_DEPTH) while the current one is filtered, and paging stops
+    at the page that reaches back to the cutoff.
+  • Every scan measures how many messages an hour it fetches from the
+    channel (videos in "search" mode, every post in "history").  When that
+    rate over the time since the last scan comes to more than a page, the
+    window is split into date slices — one per expected page, at most
+    SHARD_SLICES — fetched concurrently from their own offset dates and
+    merged back in order.
+  • Scans are incremental: each channel's history is read only down to the
+    newest message seen last time, and older videos are ranked from the
+    video_cache table.  Cached view counts are trusted for VIEWS_TTL
+    seconds; after that only the channel's top REFRESH_TOP contenders are
+    re-read.  Right before selection the shortlist's counts older than
+    FINAL_TTL are refreshed once more, in bulk (messages.GetMessagesViews,
+    no message bodies), and rescored.
+  • A video already sent (or picked this run) from any channel is skipped
+    everywhere, matched by file_unique_id or a size/duration/mime fingerprint.
+  • Every run is journalled (db job_runs/job_steps): a run cut short by a
+    restart resumes with the channels it had not finished and forwards the
+    picks it had recorded but not yet sent.  A pre-scan (prescan=True) uses
+    the same journal to do the heavy scanning ahead of the send time.
+  • Channels are scanned concurrently (at most SCAN_CONCURRENCY at a time)
+    and feed a queue drained by a single forwarder, so copying overlaps
+    with the remaining scans while batches reach the target one at a time,
+    in queue order; each channel's picks go out as one multi-message
+    request and one DB commit, in rank order.
+  • Channels can be split across several daily send windows (see
+    scheduling.py); each window's job scans and sends only its own
+    channels, and MAX_VIDEOS_TOTAL applies per window.
 """
 
+import asyncio
 import logging
-from datetime import datetime, timedelta, timezone
+import math
+import time
+from contextlib import aclosing, suppress
+from datetime import date, datetime, timedelta, timezone
+from statistics import median
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
 
-from pyrogram import Client
+from pyrogram import Client, raw, utils
+from pyrogram.file_id import FileUniqueId, FileUniqueType
 from pyrogram.types import Message
 
-from db import get_channels, mark_as_sent, was_sent_today
+from candidates import Candidate
+from db import (
+    get_cached_videos,
+    finish_run,
+    get_channel_stats,
+    get_channels,
+    get_run_progress,
+    get_scan_marks,
+    get_scan_rates,
+    get_sent_fingerprints,
+    get_sent_today,
+    get_window_channels,
+    mark_many_as_sent,
+    prune_video_cache,
+    record_selection,
+    save_channel_stats,
+    save_scan,
+    start_run,
+    update_cached_counts,
+    update_cached_views,
+)
+from ranking import TopK
+from ratelimit import RateLimiter
+from scoring import Baseline, Batch, Scorer, get_scorer
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 LOOKBACK_HOURS     = 24   # How far back to search each scan
-SCAN_LIMIT         = 100  # Max messages to check per channel
+SCAN_MODE          = "search"  # "search" = videos only, server-side; "history" = every message
+SCAN_LIMIT         = 100  # Max messages to check per channel ("history" mode; per slice when sliced)
+SEARCH_LIMIT       = 1000 # Max videos to fetch per channel ("search" mode; per slice when sliced)
+PAGE_SIZE          = 100  # Messages per GetHistory / Search request (Telegram's max)
+RAW_SCAN           = True # Build Candidates from raw TL messages, skipping pyrogram's Message parsing
+PREFETCH_DEPTH     = 2    # History pages fetched ahead of the filter (0 = fetch on demand)
+SHARD_SLICES       = 4    # Max date slices fetched concurrently when a scan expects several pages
+RATE_SPAN          = 3600 # Seconds of history a scan must cover to update a channel's fetch rate
 VIDEOS_PER_CHANNEL = 3    # Max videos to send per channel per run
+MAX_VIDEOS_TOTAL   = 0    # Max videos to send per run across all channels (0 = no cap)
+SCAN_CONCURRENCY   = 5    # Channels scanned in parallel
+SCAN_TIMEOUT       = 120  # Seconds before a single channel's scan is abandoned, FloodWait pauses excluded
+RESUME_WINDOW      = 6 * 3600  # Seconds an unfinished run (or pre-scan) stays resumable
+FORWARD_BATCH      = 100  # Max message IDs Telegram accepts per forward request
+REFRESH_BATCH      = 200  # Max message IDs per get_messages call
+VIEWS_BATCH        = 100  # Max message IDs per messages.GetMessagesViews call
+FINAL_TTL          = 300  # Seconds a shortlisted video's counts are trusted at selection
+VIEWS_TTL          = 1800 # Seconds a cached view count is trusted
+REFRESH_TOP        = 10   # Top cached videos per channel whose views get refreshed
+DUPLICATE_DAYS     = 7    # How long a sent video blocks its reposts in other channels
+SCORING            = "velocity"  # Ranking function, see scoring.SCORERS
+STATS_TTL          = 86400 # Seconds a channel's subscriber count is trusted
+BASELINE_SAMPLES   = 3    # Cached videos needed before a channel's median views is updated
+
+# (channels done, channels to scan, videos sent so far) → e.g. edit a status message
+Progress = Callable[[int, int, int], Awaitable[None]]
+
+
+def prescan_time(hour: int, minute: int, lead_minutes: int) -> tuple[int, int]:
+    """The (hour, minute) that is `lead_minutes` before a send time."""
+    total = (hour * 60 + minute - lead_minutes) % (24 * 60)
+    return total // 60, total % 60
+
+
+def _fingerprint(size: int | None, duration, mime_type: str | None) -> str | None:
+    """Fallback identity for a video when file_unique_id differs between reposts."""
+    if not size:
+        return None
+    return f"{size}:{duration or 0}:{mime_type or ''}"
+
+
+def _reaction_count(msg) -> int:
+    reactions = getattr(msg, "reactions", None)
+    return sum(r.count or 0 for r in reactions.reactions or []) if reactions else 0
+
+
+# ── Scan pipeline: history → date window → videos → Candidate ──────────────
+
+def _utc(dt: datetime) -> datetime:
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+async def _pages(
+    userbot: Client,
+    channel_id: str,
+    min_id: int,
+    cutoff: datetime,
+    before: int = 0,
+) -> AsyncIterator[raw.base.messages.Messages]:
+    """
+    Raw history pages newer than min_id, newest first: every message
+    (messages.GetHistory, up to SCAN_LIMIT) or, in "search" mode, only the
+    videos posted since cutoff (messages.Search, up to SEARCH_LIMIT).
+    No page is requested past the one that reaches back to the cutoff.
+
+    Messages older than cutoff are dropped from the last page.  With
+    `before` (a unix time) only the date slice [cutoff, before) is read,
+    so adjacent slices never overlap.
+    """
+    search    = SCAN_MODE == "search"
+    budget    = SEARCH_LIMIT if search else SCAN_LIMIT
+    cutoff_ts = int(cutoff.timestamp())
+    peer    = await userbot.resolve_peer(channel_id)
+    offset  = 0
+    fetched = 0
+    while fetched < budget:
+        limit = min(PAGE_SIZE, budget - fetched)
+        if search:
+            request = raw.functions.messages.Search(
+                peer=peer,
+                q="",
+                filter=raw.types.InputMessagesFilterVideo(),
+                min_date=cutoff_ts - 1,  # Exclusive, like max_date: keep posts at the cutoff
+                max_date=before,
+                offset_id=offset,
+                add_offset=0,
+                limit=limit,
+                max_id=0,
+                min_id=min_id,
+                hash=0,
+            )
+        else:
+            request = raw.functions.messages.GetHistory(
+                peer=peer,
+                offset_id=offset,
+                offset_date=before if not offset else 0,
+                add_offset=0,
+                limit=limit,
+                max_id=0,
+                min_id=min_id,
+                hash=0,
+            )
+        result = await userbot.invoke(request)
+        if not result.messages:
+            return
+        if getattr(result.messages[-1], "date", cutoff_ts) < cutoff_ts:
+            # Reached the cutoff: drop what's older (it would overlap the next
+            # slice) and request no further pages
+            result.messages = [
+                m for m in result.messages if getattr(m, "date", cutoff_ts) >= cutoff_ts
+            ]
+            if result.messages:
+                yield result
+            return
+        yield result
+        if len(result.messages) < limit:
+            return  # Short page: nothing older matches
+        fetched += len(result.messages)
+        offset   = result.messages[-1].id
+
+
+def _slices(fetch_rate: float, since: float) -> int:
+    """
+    How many date slices a channel's scan is worth: one per page it is
+    expected to fetch (`fetch_rate` messages an hour since `since`), up to
+    SHARD_SLICES.  1 means a plain sequential scan.
+    """
+    expected = fetch_rate * max(0.0, time.time() - since) / 3600
+    return max(1, min(SHARD_SLICES, math.ceil(expected / PAGE_SIZE)))
+
+
+async def _sharded_pages(
+    userbot: Client,
+    channel_id: str,
+    min_id: int,
+    cutoff: datetime,
+    shards: int,
+    since: float = 0,
+) -> AsyncIterator[raw.base.messages.Messages]:
+    """
+    The same pages as _pages, for channels that post too much to page
+    through one request at a time: the part of the window after `since`
+    (the last scan; nothing older is above min_id) is cut into `shards`
+    equal date slices, all read concurrently (each from its own offset
+    date), and the slices are yielded newest first so the stream stays in
+    _pages' order.  The oldest slice still reaches down to cutoff.
+
+    Every slice gets the full page budget.  The newest slice therefore
+    reads the same messages _pages alone would, and the older slices only
+    add to them.  Splitting the budget would leave out part of what _pages
+    reads, and the high-water mark would then skip it for good.
+    """
+    floor = int(cutoff.timestamp())
+    start = max(floor, int(since))
+    step  = (time.time() - start) / shards
+    edges = [floor] + [start + int(step * i) for i in range(1, shards)] + [0]  # 0 = up to now
+
+    async def fetch(since: int, before: int) -> list[raw.base.messages.Messages]:
+        since_dt = datetime.fromtimestamp(since, timezone.utc)
+        async with aclosing(_pages(userbot, channel_id, min_id, since_dt, before)) as pages:
+            return [result async for result in pages]
+
+    tasks = [
+        asyncio.create_task(fetch(edges[i], edges[i + 1])) for i in reversed(range(shards))
+    ]
+    try:
+        slices = await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()  # If one slice failed, the others stop too
+    for pages in slices:
+        for result in pages:
+            yield result
+
+
+class _FetchRate:
+    """
+    Messages per hour a channel's scan fetches — videos in "search" mode,
+    every post in "history" — from the count and dates of what it saw.
+    """
+    __slots__ = ("count", "newest", "oldest")
+
+    def __init__(self) -> None:
+        self.count  = 0
+        self.newest = 0
+        self.oldest = 0
+
+    def observe(self, result: raw.base.messages.Messages) -> None:
+        for msg in result.messages:
+            if isinstance(msg, raw.types.MessageEmpty):
+                continue
+            self.count += 1
+            self.newest = max(self.newest, msg.date)
+            self.oldest = min(self.oldest or msg.date, msg.date)
+
+    @property
+    def per_hour(self) -> float | None:
+        """None when the scan covered less than RATE_SPAN seconds."""
+        span = self.newest - self.oldest
+        if self.count < 2 or span < RATE_SPAN:
+            return None
+        return (self.count - 1) * 3600 / span
+
+
+async def _observed(
+    pages: AsyncIterator[raw.base.messages.Messages], rate: _FetchRate
+) -> AsyncIterator[raw.base.messages.Messages]:
+    async with aclosing(pages) as pages:
+        async for result in pages:
+            rate.observe(result)
+            yield result
+
+
+class _Failed:
+    """An exception raised in _prefetch's producer, handed over to the consumer."""
+    __slots__ = ("exc",)
+
+    def __init__(self, exc: Exception) -> None:
+        self.exc = exc
+
+
+async def _prefetch(source: AsyncIterator[T], depth: int = PREFETCH_DEPTH) -> AsyncIterator[T]:
+    """
+    Yield from `source` while a background task already fetches what comes
+    next, so the next page's round trip overlaps with filtering this one.
+    At most `depth` items wait unconsumed; closing the iterator early
+    cancels the read-ahead.
+    """
+    if depth <= 0:
+        async with aclosing(source) as items:
+            async for item in items:
+                yield item
+        return
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=depth)
+    end = object()
+
+    async def produce() -> None:
+        try:
+            async with aclosing(source) as items:
+                async for item in items:
+                    await queue.put(item)
+        except Exception as exc:
+            await queue.put(_Failed(exc))
+        else:
+            await queue.put(end)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (item := await queue.get()) is not end:
+            if isinstance(item, _Failed):
+                raise item.exc
+            yield item
+    finally:
+        producer.cancel()
+        with suppress(asyncio.CancelledError):
+            await producer
+
+
+async def _messages(
+    userbot: Client, pages: AsyncIterator[raw.base.messages.Messages], mark: list[int]
+) -> AsyncIterator[Message]:
+    """Raw pages parsed into pyrogram Messages; mark[0] is raised to the newest ID seen."""
+    async with aclosing(pages) as pages:
+        async for result in pages:
+            for msg in await utils.parse_messages(userbot, result, replies=0):
+                mark[0] = max(mark[0], msg.id)
+                yield msg
+
+
+def _raw_candidate(msg: raw.base.Message) -> Candidate | None:
+    """A Candidate straight from a raw TL message, or None if it isn't a plain video."""
+    media = getattr(msg, "media", None)
+    if not isinstance(media, raw.types.MessageMediaDocument):
+        return None
+    doc = media.document
+    if not isinstance(doc, raw.types.Document):
+        return None
+
+    # Same classification as pyrogram.types.Message: GIFs and stickers carry
+    # a video attribute too, and round videos are video notes
+    video = None
+    for attr in doc.attributes:
+        if isinstance(attr, (raw.types.DocumentAttributeAnimated, raw.types.DocumentAttributeSticker)):
+            return None
+        if isinstance(attr, raw.types.DocumentAttributeVideo):
+            video = attr
+    if video is None or video.round_message:
+        return None
+
+    reactions = msg.reactions
+    return Candidate(
+        id=msg.id,
+        date=msg.date,
+        duration=video.duration or 0,
+        views=msg.views or 0,
+        forwards=msg.forwards or 0,
+        reactions=sum(r.count or 0 for r in reactions.results) if reactions else 0,
+        file_unique_id=FileUniqueId(
+            file_unique_type=FileUniqueType.DOCUMENT, media_id=doc.id
+        ).encode(),
+        fingerprint=_fingerprint(doc.size, video.duration, doc.mime_type),
+    )
+
+
+async def _raw_videos(
+    pages: AsyncIterator[raw.base.messages.Messages], mark: list[int], cutoff: datetime
+) -> AsyncIterator[Candidate]:
+    """
+    Fast path: Candidates from raw pages without building pyrogram Message
+    objects (no user/chat/entity/media parsing).  Stops at the first message
+    older than cutoff; mark[0] is raised to the newest ID seen.
+    """
+    cutoff_ts = int(cutoff.timestamp())
+    async with aclosing(pages) as pages:
+        async for result in pages:
+            for msg in result.messages:
+                if isinstance(msg, raw.types.MessageEmpty):
+                    continue
+                if msg.date < cutoff_ts:
+                    return
+                mark[0] = max(mark[0], msg.id)
+                if candidate := _raw_candidate(msg):
+                    yield candidate
+
+
+async def _within(messages: AsyncIterator[Message], cutoff: datetime) -> AsyncIterator[Message]:
+    """Stop at the first message older than cutoff — no further pages are fetched."""
+    async for msg in messages:
+        if _utc(msg.date) < cutoff:
+            return
+        yield msg
+
+
+async def _videos(messages: AsyncIterator[Message]) -> AsyncIterator[Candidate]:
+    async for msg in messages:
+        video = msg.video
+        if not video:
+            continue
+        yield Candidate(
+            id=msg.id,
+            date=int(_utc(msg.date).timestamp()),
+            duration=video.duration or 0,
+            views=msg.views or 0,
+            forwards=msg.forwards or 0,
+            reactions=_reaction_count(msg),
+            file_unique_id=video.file_unique_id,
+            fingerprint=_fingerprint(video.file_size, video.duration, video.mime_type),
+        )
+
+
+async def _refresh_counts(
+    userbot: Client,
+    data_dir: str,
+    channel_id: str,
+    message_ids: list[int],
+) -> dict[int, tuple[int, int, int]]:
+    """Re-read (views, forwards, reactions) for cached videos; deleted ones leave the cache."""
+    counts: dict[int, tuple[int, int, int]] = {}
+    gone: list[int] = []
+    for i in range(0, len(message_ids), REFRESH_BATCH):
+        batch = message_ids[i:i + REFRESH_BATCH]
+        for msg in await userbot.get_messages(channel_id, batch, replies=0):
+            if msg.empty or not msg.video:
+                gone.append(msg.id)
+            else:
+                counts[msg.id] = (msg.views or 0, msg.forwards or 0, _reaction_count(msg))
+    await update_cached_counts(data_dir, channel_id, counts, gone)
+    return counts
+
+
+async def _baseline(
+    userbot: Client,
+    data_dir: str,
+    channel_id: str,
+    known: tuple[int, int, float] | None,
+    views: list[int],
+) -> Baseline:
+    """
+    The channel's scoring baseline: median views of its cached videos (kept
+    from the last run when there are too few to judge), and its subscriber
+    count, re-fetched at most once per STATS_TTL.
+    """
+    subscribers, subscribers_at, median_views = known or (0, 0, 0.0)
+
+    if time.time() - subscribers_at > STATS_TTL:
+        try:
+            chat = await userbot.get_chat(channel_id)
+            subscribers, subscribers_at = chat.members_count or 0, int(time.time())
+        except Exception as exc:
+            logger.warning("Could not read subscriber count of %s: %s", channel_id, exc)
+
+    if len(views) >= BASELINE_SAMPLES:
+        median_views = float(median(views))
+
+    if (subscribers, subscribers_at, median_views) != known:
+        await save_channel_stats(data_dir, channel_id, subscribers, subscribers_at, median_views)
+    return Baseline(median_views=median_views, subscribers=subscribers)
+
+
+def _score(
+    scorer: Scorer, candidates: list[Candidate], baseline: Baseline, now: float
+) -> list[float]:
+    batch = Batch()
+    for c in candidates:
+        batch.views.append(c.views)
+        batch.forwards.append(c.forwards)
+        batch.reactions.append(c.reactions)
+        batch.dates.append(c.date)
+    return scorer(batch, baseline, now)
+
+
+async def _scan_channel(
+    userbot: Client,
+    data_dir: str,
+    channel_id: str,
+    last_id: int,
+    scan_rate: tuple[float, int],
+    cutoff: datetime,
+    min_duration: int,
+    sent_today: set[tuple[str, str]],
+    seen: set[str],
+    stats: dict[str, tuple[int, int, float]],
+    scorer: Scorer,
+    ranker: TopK,
+) -> Baseline:
+    """
+    Push this channel's videos since cutoff into `ranker` as Candidates,
+    ranked by `scorer`.
+    Videos sent today, or whose keys are in `seen`, are left out.
+
+    Only history newer than `last_id` (the channel's high-water mark) is
+    downloaded (all of it, or just the videos in "search" mode); earlier
+    videos come from video_cache.  Counts older than VIEWS_TTL are re-read
+    in bulk for the leading contenders only, instead of re-paging the
+    history.  `scan_rate` is the channel's (fetch rate, last scan time):
+    when more than a page is due, the window is fetched as concurrent date
+    slices (see _slices).
+    Returns the channel's scoring baseline.
+    """
+    mark = [last_id]
+    rate = _FetchRate()
+    fetch_rate, scanned_at = scan_rate
+    since  = max(cutoff.timestamp(), scanned_at if last_id else 0)
+    shards = _slices(fetch_rate, since)
+    if shards > 1:
+        logger.info("%s: %.0f msgs/h due — fetching in %d slices.", channel_id, fetch_rate, shards)
+        pages = _sharded_pages(userbot, channel_id, last_id, cutoff, shards, since)
+    else:
+        pages = _prefetch(_pages(userbot, channel_id, last_id, cutoff))
+    pages = _observed(pages, rate)
+    if RAW_SCAN:
+        source = _raw_videos(pages, mark, cutoff)
+    else:
+        source = _videos(_within(_messages(userbot, pages, mark), cutoff))
+    async with aclosing(source) as stream:
+        fresh = [c.cache_row() async for c in stream]
+    await save_scan(data_dir, channel_id, fresh, mark[0], rate.per_hour)
+
+    cached   = await get_cached_videos(data_dir, channel_id, int(cutoff.timestamp()), min_duration)
+    baseline = await _baseline(
+        userbot, data_dir, channel_id, stats.get(str(channel_id)), [row[3] for row in cached]
+    )
+    candidates = [
+        c for c in map(Candidate.from_row, cached)
+        if (str(c.id), str(channel_id)) not in sent_today
+        and not any(k in seen for k in c.keys())
+    ]
+    if not candidates:
+        return baseline
+
+    # Refresh the stale counts of the leading contenders, then score for real
+    now     = time.time()
+    scores  = _score(scorer, candidates, baseline, now)
+    leaders = sorted(range(len(candidates)), key=scores.__getitem__, reverse=True)[:REFRESH_TOP]
+    stale   = [candidates[i].id for i in leaders if candidates[i].fetched_at < now - VIEWS_TTL]
+    if stale:
+        counts = await _refresh_counts(userbot, data_dir, channel_id, stale)
+        stale_set = set(stale)
+        kept: list[Candidate] = []
+        for c in candidates:
+            if c.id in counts:
+                c.views, c.forwards, c.reactions = counts[c.id]
+                c.fetched_at = int(now)
+            elif c.id in stale_set:
+                continue  # Deleted since it was cached
+            kept.append(c)
+        candidates = kept
+        scores     = _score(scorer, candidates, baseline, now)
+
+    for c, score in zip(candidates, scores):
+        ranker.push(channel_id, score, c)
+    return baseline
+
+
+async def _scan_deadline(coro: Awaitable[T], limiter: RateLimiter | None) -> T:
+    """
+    Await a channel scan for up to SCAN_TIMEOUT seconds, not counting time
+    the rate limiter spent paused on FloodWait: a pause holds every scan in
+    flight, it doesn't mean this channel is stuck.
+    """
+    task     = asyncio.ensure_future(coro)
+    deadline = time.monotonic() + SCAN_TIMEOUT
+    paused   = limiter.waited if limiter else 0.0
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=max(0.0, deadline - time.monotonic()))
+            if done:
+                return task.result()
+            extra = (limiter.waited if limiter else 0.0) - paused
+            if extra <= 0:
+                raise asyncio.TimeoutError
+            deadline += extra
+            paused   += extra
+    finally:
+        if not task.done():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+
+async def _refresh_finalists(
+    userbot: Client, data_dir: str, picks: dict[str, list[Candidate]]
+) -> None:
+    """
+    Re-read views and forwards of shortlisted videos in place, with one
+    messages.GetMessagesViews call per VIEWS_BATCH IDs of a channel (no
+    message bodies are downloaded); deleted messages are removed.
+    """
+
+    async def refresh(channel_id: str, candidates: list[Candidate]) -> None:
+        peer = await userbot.resolve_peer(channel_id)
+        now  = int(time.time())
+        counts: dict[int, tuple[int, int]] = {}
+        gone:   list[int] = []
+        for i in range(0, len(candidates), VIEWS_BATCH):
+            batch  = candidates[i:i + VIEWS_BATCH]
+            result = await userbot.invoke(
+                raw.functions.messages.GetMessagesViews(
+                    peer=peer, id=[c.id for c in batch], increment=False
+                )
+            )
+            for c, views in zip(batch, result.views):
+                if views.views is None:  # Channel posts always carry a count — deleted
+                    gone.append(c.id)
+                    continue
+                c.views, c.forwards, c.fetched_at = views.views, views.forwards or 0, now
+                counts[c.id] = (c.views, c.forwards)
+        # GetMessagesViews carries no reactions, and picks rebuilt from the
+        # journal don't know theirs: leave the cached count alone
+        await update_cached_views(data_dir, channel_id, counts, gone)
+        candidates[:] = [c for c in candidates if c.id in counts]
+
+    results = await asyncio.gather(
+        *(refresh(cid, cands) for cid, cands in picks.items()), return_exceptions=True
+    )
+    for channel_id, result in zip(picks, results):
+        if isinstance(result, Exception):
+            logger.warning("Could not refresh picks of %s: %s", channel_id, result)
+
+
+async def _rerank(
+    userbot: Client,
+    data_dir: str,
+    picks: TopK[Candidate],
+    scorer: Scorer,
+    baselines: dict[str, Baseline],
+) -> TopK[Candidate]:
+    """
+    Final look at the shortlist before selection: counts older than
+    FINAL_TTL are refreshed in bulk across all channels, then everything
+    is rescored.  Returns `picks` itself when nothing was stale.
+    """
+    now       = time.time()
+    shortlist = picks.items()
+    stale = {
+        cid: [c for c in cands if c.fetched_at < now - FINAL_TTL]
+        for cid, cands in shortlist.items()
+    }
+    stale = {cid: cands for cid, cands in stale.items() if cands}
+    if not stale:
+        return picks
+
+    asked = {cid: {c.id for c in cands} for cid, cands in stale.items()}
+    await _refresh_finalists(userbot, data_dir, stale)
+
+    reranked: TopK[Candidate] = TopK(picks.per_channel, picks.total)
+    for cid, cands in shortlist.items():
+        alive  = {c.id for c in stale.get(cid, ())}
+        cands  = [c for c in cands if c.id not in asked.get(cid, ()) or c.id in alive]
+        scores = _score(scorer, cands, baselines.get(cid, Baseline()), now)
+        for c, score in zip(cands, scores):
+            reranked.push(cid, score, c)
+    return reranked
+
+
+async def _still_there(
+    userbot: Client, channel_id: str, channel_name: str, message_ids: list[int]
+) -> list[int]:
+    """The IDs among `message_ids` that still exist (a short batch skipped the rest)."""
+    try:
+        messages = await userbot.get_messages(str(channel_id), message_ids, replies=0)
+    except Exception as exc:
+        # Can't tell which ones went out — recording none beats recording ghosts
+        logger.warning("Could not re-read msgs of %s after a short batch: %s", channel_name, exc)
+        return []
+    present = [msg.id for msg in messages if not msg.empty]
+    logger.info(
+        "Batch from %s: %d of %d msgs were deleted and skipped.",
+        channel_name, len(message_ids) - len(present), len(message_ids),
+    )
+    return present
+
+
+async def _forward_batch(
+    userbot: Client,
+    target_channel: str,
+    channel_id: str,
+    channel_name: str,
+    message_ids: list[int],
+) -> list[int]:
+    """
+    Copy `message_ids` from one channel to the target, returning those that went out.
+
+    Uses a single forward_messages call with drop_author (a copy without the
+    "forwarded from" header) per FORWARD_BATCH IDs; if a batch is rejected,
+    falls back to copying its messages one by one so one bad message can't
+    sink the rest.  Telegram silently skips deleted messages in a batch, so
+    when fewer messages come back than were asked for, the source IDs are
+    re-read and only those that still exist count as sent.
+    """
+    sent: list[int] = []
+    for i in range(0, len(message_ids), FORWARD_BATCH):
+        batch = message_ids[i:i + FORWARD_BATCH]
+        try:
+            forwarded = await userbot.forward_messages(
+                chat_id=target_channel,
+                from_chat_id=str(channel_id),
+                message_ids=batch,
+                drop_author=True,
+            )
+        except Exception as exc:
+            logger.warning(
+                "Batch copy of %d msgs from %s failed (%s) — copying one by one.",
+                len(batch), channel_name, exc,
+            )
+        else:
+            if len(forwarded) == len(batch):
+                sent.extend(batch)
+            else:
+                sent.extend(await _still_there(userbot, channel_id, channel_name, batch))
+            continue
+
+        for msg_id in batch:
+            try:
+                await userbot.copy_message(
+                    chat_id=target_channel,
+                    from_chat_id=str(channel_id),
+                    message_id=msg_id,
+                )
+                sent.append(msg_id)
+            except Exception as exc:
+                logger.warning(
+                    "Failed to copy msg %s from %s: %s", msg_id, channel_name, exc
+                )
+    return sent
 
 
 async def daily_job(
@@ -27,70 +764,200 @@ async def daily_job(
     min_duration: int,
     admin_id: int,
     data_dir: str,
+    prescan: bool = False,
+    window: str | None = None,
+    progress: Progress | None = None,
+    rate_limiter: RateLimiter | None = None,
 ) -> None:
-    """For every channel send up to VIDEOS_PER_CHANNEL top-viewed videos."""
-    logger.info("Daily job started.")
+    """
+    Send the top-scoring videos: up to VIDEOS_PER_CHANNEL each, MAX_VIDEOS_TOTAL overall.
+
+    Only the channels assigned to send `window` ("HH:MM") are scanned;
+    None is the default window (the send time in settings).
+
+    With prescan=True only the scan and selection run: the picks are
+    journalled and the run is left open, so the job at send time resumes it,
+    refreshes the finalists' counts and forwards them without scanning.
+
+    `progress`, if given, is awaited as (channels done, channels to scan,
+    videos sent so far) each time a channel scan finishes.  Time
+    `rate_limiter` spends paused on FloodWait doesn't count toward a
+    channel's SCAN_TIMEOUT.
+    """
+    logger.info(
+        "Daily job started%s%s.",
+        f" for window {window}" if window else "", " (pre-scan)" if prescan else "",
+    )
 
     try:
-        channels = await get_channels(data_dir)
+        channels = await get_window_channels(data_dir, window)
         if not channels:
-            await bot.send_message(admin_id, "⚠️ אין ערוצים ברשימה. הוסף עם /addchannel.")
+            if await get_channels(data_dir):
+                logger.info("No channels in send window %s — nothing to do.", window or "default")
+            else:
+                await bot.send_message(admin_id, "⚠️ אין ערוצים ברשימה. הוסף עם /addchannel.")
             return
 
         cutoff = datetime.now(timezone.utc) - timedelta(hours=LOOKBACK_HOURS)
+        sent_today = await get_sent_today(data_dir)
+        seen       = await get_sent_fingerprints(
+            data_dir, str(date.today() - timedelta(days=DUPLICATE_DAYS))
+        )
+        marks      = await get_scan_marks(data_dir)
+        rates      = await get_scan_rates(data_dir)
+        stats      = await get_channel_stats(data_dir)
+        scorer     = get_scorer(SCORING)
+        await prune_video_cache(data_dir, int(cutoff.timestamp()))
+
+        # Pick up where a run cut short today (redeploy, crash) left off
+        run_id, resumed  = await start_run(data_dir, RESUME_WINDOW, window, prescan)
+        scanned, pending, sent_before = await get_run_progress(data_dir, run_id)
+        if resumed:
+            logger.info(
+                "Resuming run %d: %d channels already scanned, %d picks left to forward.",
+                run_id, len(scanned), len(pending),
+            )
 
         total_sent  = 0
+        prepared    = 0
+        scans_done  = 0
         scan_errors: list[str] = []
 
-        for channel_id, channel_name in channels:
-            logger.info("Scanning: %s (%s)", channel_name, channel_id)
-            candidates: list[Message] = []
+        # Without a global cap a channel's picks are final as soon as its own
+        # scan ends, so they are handed to the forwarder right away; with
+        # one, selection has to wait for every channel.
+        streaming    = MAX_VIDEOS_TOTAL <= 0
+        names        = dict(channels)
+        limiter      = asyncio.Semaphore(SCAN_CONCURRENCY)
+        baselines: dict[str, Baseline] = {}
+        queue: asyncio.Queue[tuple[str, list[Candidate]] | None] = asyncio.Queue()
 
+        async def enqueue(picks: TopK[Candidate], order: list[str]) -> None:
+            nonlocal prepared
+            picks = await _rerank(userbot, data_dir, picks, scorer, baselines)
+            # Best first, one copy per video; grouped by channel for batch forwarding
+            selected: dict[str, list[Candidate]] = {}
+            for channel_id, c in picks.result(keys=Candidate.keys, seen=seen):
+                selected.setdefault(channel_id, []).append(c)
+            await record_selection(
+                data_dir, run_id, order,
+                [(cid, c.id, c.views, *c.keys()) for cid in order for c in selected.get(cid, [])],
+            )
+            prepared += sum(len(v) for v in selected.values())
+            if prescan:
+                return
+            for channel_id in order:
+                if selected.get(channel_id):
+                    queue.put_nowait((channel_id, selected[channel_id]))
+
+        async def scan(channel_id: str, channel_name: str) -> None:
+            nonlocal scans_done
+            picks = TopK(VIDEOS_PER_CHANNEL) if streaming else ranker
             try:
-                async for msg in userbot.get_chat_history(channel_id, limit=SCAN_LIMIT):
-                    msg_time = msg.date
-                    if msg_time.tzinfo is None:
-                        msg_time = msg_time.replace(tzinfo=timezone.utc)
-                    if msg_time < cutoff:
-                        break
-
-                    video = msg.video
-                    if not video or (video.duration or 0) < min_duration:
-                        continue
-                    if await was_sent_today(data_dir, str(msg.id), str(channel_id)):
+                async with limiter:
+                    logger.info("Scanning: %s (%s)", channel_name, channel_id)
+                    baselines[channel_id] = await _scan_deadline(
+                        _scan_channel(
+                            userbot, data_dir, channel_id, marks.get(str(channel_id), 0),
+                            rates.get(str(channel_id), (0.0, 0)), cutoff, min_duration,
+                            sent_today, seen, stats, scorer, picks,
+                        ),
+                        rate_limiter,
+                    )
+                if streaming:
+                    await enqueue(picks, [channel_id])
+            finally:
+                scans_done += 1
+                if progress is not None:
+                    await progress(scans_done, len(to_scan), total_sent)
+
+        async def forwarder() -> None:
+            nonlocal total_sent
+            while (item := await queue.get()) is not None:
+                channel_id, top = item
+                channel_name = names[channel_id]
+                try:
+                    picked = {c.id: c for c in top}
+                    sent = await _forward_batch(
+                        userbot, target_channel, channel_id, channel_name, list(picked)
+                    )
+                    if not sent:
                         continue
 
-                    candidates.append(msg)
+                    await mark_many_as_sent(
+                        data_dir,
+                        [(str(mid), str(channel_id), *picked[mid].keys()) for mid in sent],
+                        run_id=run_id,
+                    )
+                    total_sent += len(sent)
+                    for msg_id in sent:
+                        logger.info(
+                            "Sent video from %s (msg_id=%s, views=%s).",
+                            channel_name, msg_id, picked[msg_id].views,
+                        )
+                except Exception as exc:
+                    logger.warning("Forwarding from %s failed: %s", channel_name, exc)
 
-            except Exception as exc:
+        # Picks journalled earlier (a pre-scan, or a run that was cut short)
+        # go out first, after a quick re-read of their counts
+        leftovers: dict[str, list[Candidate]] = {}
+        for channel_id, mid, views, fuid, fp in pending:
+            if channel_id in names and (str(mid), channel_id) not in sent_today:
+                c = Candidate(mid, 0, 0, views, 0, 0, fuid, fp)
+                seen.update(k for k in c.keys() if k)
+                leftovers.setdefault(channel_id, []).append(c)
+        if leftovers and not prescan:
+            await _refresh_finalists(userbot, data_dir, leftovers)
+            for item in leftovers.items():
+                if item[1]:
+                    queue.put_nowait(item)
+
+        to_scan = [(cid, cname) for cid, cname in channels if cid not in scanned]
+
+        # What this run already sent, or still holds from the journal, counts
+        # toward the global cap: the channels left to scan share the rest
+        cap = MAX_VIDEOS_TOTAL
+        if cap > 0:
+            cap -= sent_before + sum(len(v) for v in leftovers.values())
+            if cap <= 0:
+                logger.info("Global cap already reached by journalled picks — no scan needed.")
+                to_scan = []
+        ranker: TopK[Candidate] = TopK(VIDEOS_PER_CHANNEL, max(cap, 0))
+
+        # One forwarder: batches from different channels must not interleave
+        # in the target, whose post order is the order they leave the queue
+        sender = None if prescan else asyncio.create_task(forwarder())
+        try:
+            results = await asyncio.gather(
+                *(scan(cid, cname) for cid, cname in to_scan),
+                return_exceptions=True,
+            )
+            if not streaming:
+                await enqueue(ranker, [
+                    cid for (cid, _), result in zip(to_scan, results)
+                    if not isinstance(result, BaseException)
+                ])
+            if sender is not None:
+                queue.put_nowait(None)
+                await sender
+        finally:
+            if sender is not None:
+                sender.cancel()
+
+        for (channel_id, channel_name), result in zip(to_scan, results):
+            if isinstance(result, BaseException):
+                exc = f"timed out after {SCAN_TIMEOUT}s" if isinstance(result, asyncio.TimeoutError) else result
                 logger.warning("Could not scan %s: %s", channel_name, exc)
                 scan_errors.append(f"• {channel_name}: `{exc}`")
-                continue
 
-            if not candidates:
-                continue
-
-            # Sort by views descending and take the top N
-            candidates.sort(key=lambda m: m.views or 0, reverse=True)
-            top = candidates[:VIDEOS_PER_CHANNEL]
+        if prescan:
+            # Channels that failed are simply rescanned by the send job
+            logger.info(
+                "Pre-scan done: %d videos ready, %d channels failed.", prepared, len(scan_errors)
+            )
+            return
 
-            for msg in top:
-                try:
-                    await userbot.copy_message(
-                        chat_id=target_channel,
-                        from_chat_id=str(channel_id),
-                        message_id=msg.id,
-                    )
-                    await mark_as_sent(data_dir, str(msg.id), str(channel_id))
-                    total_sent += 1
-                    logger.info(
-                        "Sent video from %s (msg_id=%s, views=%s).",
-                        channel_name, msg.id, msg.views,
-                    )
-                except Exception as exc:
-                    logger.warning(
-                        "Failed to copy msg %s from %s: %s", msg.id, channel_name, exc
-                    )
+        await finish_run(data_dir, run_id)
 
         # ── Summary report ────────────────────────────────────────────────────
         if total_sent == 0:
@@ -111,10 +978,12 @@ async def daily_job(
                 )
             return
 
+        cap_note = f", עד {MAX_VIDEOS_TOTAL} בסך הכול" if MAX_VIDEOS_TOTAL else ""
         await bot.send_message(
             admin_id,
-            f"✅ נשלחו **{total_sent}** סרטונים מ-{len(channels)} ערוצים\n"
-            f"(עד {VIDEOS_PER_CHANNEL} סרטונים עם הכי הרבה צפיות מכל ערוץ)",
+            f"✅ נשלחו **{total_sent}** סרטונים מ-{len(channels)} ערוצים"
+            f"{f' (חלון {window})' if window else ''}\n"
+            f"(עד {VIDEOS_PER_CHANNEL} סרטונים מובילים מכל ערוץ{cap_note})",
         )
         if scan_errors:
             await bot.send_message(
@@ -0,0 +1,93 @@
+"""
+Send-window scheduling — one cron job per send window, plus its pre-scan.
+
+The default window is the send time stored in settings (jobs "daily_send"
+and "daily_prescan"); extra windows from the send_windows table get
+"window_HHMM" / "prescan_HHMM".  Each channel belongs to exactly one
+window, so every job scans only its own channels, in a single pass.
+
+Jobs don't call daily_job directly: they go through the shared JobRunner
+under their job id (runner.run_once), so they never overlap with each other
+or /sendnow, and each firing runs once even with several replicas.  A send
+run cut short by a restart is re-submitted the same way at startup
+(resume_window), since APScheduler doesn't re-fire a missed cron job.
+"""
+
+from functools import partial
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from runner import JobRunner
+from scanner import daily_job, prescan_time
+
+
+def parse_time(text: str) -> tuple[int, int] | None:
+    """'HH:MM' → (hour, minute), or None if it isn't a valid time of day."""
+    try:
+        h, m = text.strip().split(":")
+        hour, minute = int(h), int(m)
+    except ValueError:
+        return None
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        return None
+    return hour, minute
+
+
+def window_key(hour: int, minute: int) -> str:
+    return f"{hour:02d}:{minute:02d}"
+
+
+def job_ids(window: str | None) -> tuple[str, str]:
+    """(send job id, pre-scan job id) for a window; None is the default window."""
+    if window is None:
+        return "daily_send", "daily_prescan"
+    key = window.replace(":", "")
+    return f"window_{key}", f"prescan_{key}"
+
+
+def schedule_window(
+    scheduler: AsyncIOScheduler,
+    runner: JobRunner,
+    window: str | None,
+    hour: int,
+    minute: int,
+    prescan_lead: int,
+    **job_kwargs,
+) -> None:
+    """(Re)create the send job — and pre-scan job, if enabled — for one window."""
+    send_id, prescan_id = job_ids(window)
+    scheduler.add_job(
+        runner.run_once,
+        trigger="cron",
+        hour=hour,
+        minute=minute,
+        id=send_id,
+        replace_existing=True,
+        args=(send_id, partial(daily_job, **job_kwargs, window=window)),
+    )
+
+    # Optional pre-scan: heavy scanning ahead of time, picks wait in the DB
+    if prescan_lead > 0:
+        pre_hour, pre_minute = prescan_time(hour, minute, prescan_lead)
+        scheduler.add_job(
+            runner.run_once,
+            trigger="cron",
+            hour=pre_hour,
+            minute=pre_minute,
+            id=prescan_id,
+            replace_existing=True,
+            args=(prescan_id, partial(daily_job, **job_kwargs, window=window, prescan=True)),
+        )
+
+
+def resume_window(runner: JobRunner, window: str | None, run_id: int, **job_kwargs) -> None:
+    """Re-submit a window's interrupted send run; daily_job picks up its journal."""
+    send_id, _ = job_ids(window)
+    job = partial(daily_job, **job_kwargs, window=window)
+    runner.spawn(runner.run_once(send_id, job, key=f"resume {run_id}"))
+
+
+def unschedule_window(scheduler: AsyncIOScheduler, window: str) -> None:
+    for job_id in job_ids(window):
+        if scheduler.get_job(job_id):
+            scheduler.remove_job(job_id)
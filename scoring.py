@@ -0,0 +1,68 @@
+"""
+Candidate scoring — turns a video's engagement numbers into a ranking score.
+
+Scorers are plain functions registered in SCORERS.  Each one scores a whole
+channel batch in a single pass (columns in, list of scores out), so the
+cost stays linear and small even with thousands of candidates:
+
+  views     – raw view count (the original ranking)
+  velocity  – engagement per hour since posting (views plus weighted
+              forwards and reactions), divided by the channel's baseline so
+              small channels and fresh posts can compete with big ones
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable
+
+FORWARD_WEIGHT  = 5.0  # One forward counts as this many views
+REACTION_WEIGHT = 2.0  # One reaction counts as this many views
+MIN_AGE_HOURS   = 1.0  # Age floor so minutes-old posts don't get runaway velocity
+
+
+@dataclass
+class Batch:
+    """One channel's candidates, column by column."""
+    views:     list[int] = field(default_factory=list)
+    forwards:  list[int] = field(default_factory=list)
+    reactions: list[int] = field(default_factory=list)
+    dates:     list[int] = field(default_factory=list)  # Unix time posted
+
+
+@dataclass
+class Baseline:
+    """What "normal" looks like for a channel (cached in channel_stats)."""
+    median_views: float = 0.0
+    subscribers:  int   = 0
+
+    @property
+    def norm(self) -> float:
+        return self.median_views or self.subscribers or 1.0
+
+
+def score_views(batch: Batch, baseline: Baseline, now: float) -> list[float]:
+    return [float(v) for v in batch.views]
+
+
+def score_velocity(batch: Batch, baseline: Baseline, now: float) -> list[float]:
+    norm = baseline.norm
+    return [
+        (v + FORWARD_WEIGHT * f + REACTION_WEIGHT * r)
+        / max((now - d) / 3600, MIN_AGE_HOURS)
+        / norm
+        for v, f, r, d in zip(batch.views, batch.forwards, batch.reactions, batch.dates)
+    ]
+
+
+Scorer = Callable[[Batch, Baseline, float], list[float]]
+
+SCORERS: dict[str, Scorer] = {
+    "views":    score_views,
+    "velocity": score_velocity,
+}
+
+
+def get_scorer(name: str) -> Scorer:
+    try:
+        return SCORERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown scorer {name!r} — choose from {', '.join(SCORERS)}") from None